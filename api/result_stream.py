@@ -0,0 +1,118 @@
+import asyncio
+import json
+import time
+from api.tiktok_api import upload_result_chunk
+from core.logger import setup_logger
+
+logger = setup_logger()
+
+# số chunk được chờ upload cùng lúc – quá ngưỡng thì crawler đợi
+# (backend chậm → buffer không dồn lại trong RAM)
+MAX_PENDING_UPLOADS = 2
+
+
+class ResultStreamer:
+    """
+    Sink cho crawler: gom item theo stream và upload từng chunk (có seq)
+    khi đủ số item / dung lượng / thời gian, trong lúc crawl vẫn chạy.
+
+    seq + danh sách chunk lỗi lưu trong checkpoint của task → lần retry
+    đánh seq tiếp (không trùng chunk lần trước) và vẫn biết backend thiếu chunk.
+    """
+
+    def __init__(self, task_id, checkpoint=None, max_items=200,
+                 max_bytes=512_000, max_interval=15,
+                 max_pending=MAX_PENDING_UPLOADS):
+        self.task_id = task_id
+        self.checkpoint = checkpoint
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.max_interval = max_interval
+        self.max_pending = max_pending
+
+        state = checkpoint.get("stream", {}) if checkpoint else {}
+        self.seq = state.get("seq", 0)
+        self.failed = list(state.get("failed", []))   # seq upload lỗi
+        self.delivered = 0
+        self.counts = {}      # stream -> số item backend đã nhận
+
+        self._buffers = {}    # stream -> [items]
+        self._sizes = {}      # stream -> bytes
+        self._last_flush = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._uploads = set()
+
+    async def __call__(self, stream, items):
+        buf = self._buffers.setdefault(stream, [])
+        for item in items:
+            buf.append(item)
+            self._sizes[stream] = self._sizes.get(stream, 0) + len(
+                json.dumps(item, ensure_ascii=False, default=str)
+            )
+
+        if (
+            len(buf) >= self.max_items
+            or self._sizes[stream] >= self.max_bytes
+            or time.monotonic() - self._last_flush >= self.max_interval
+        ):
+            self.flush()
+            await self._wait_uploads(self.max_pending)
+
+    def flush(self):
+        # upload chạy nền → crawler không phải đợi HTTP
+        for stream, buf in self._buffers.items():
+            if not buf:
+                continue
+
+            self.seq += 1
+            job = asyncio.create_task(self._upload(self.seq, stream, buf))
+            self._uploads.add(job)
+            job.add_done_callback(self._uploads.discard)
+
+            self._buffers[stream] = []
+            self._sizes[stream] = 0
+
+        self._last_flush = time.monotonic()
+        self._save()
+
+    async def _wait_uploads(self, limit):
+        while len(self._uploads) > limit:
+            await asyncio.wait(
+                self._uploads, return_when=asyncio.FIRST_COMPLETED
+            )
+
+    async def _upload(self, seq, stream, items):
+        # giữ đúng thứ tự seq khi gửi
+        async with self._lock:
+            try:
+                await upload_result_chunk(self.task_id, seq, stream, items)
+                self.delivered += 1
+                self.counts[stream] = self.counts.get(stream, 0) + len(items)
+                logger.info(
+                    f"📤 [{self.task_id}] chunk #{seq} {stream} ({len(items)})"
+                )
+            except Exception as e:
+                self.failed.append(seq)
+                self._save()
+                logger.warning(
+                    f"⚠️ [{self.task_id}] chunk #{seq} {stream} failed: {e}"
+                )
+
+    def _save(self):
+        # ghi ngay: crash giữa chừng cũng không dùng lại seq đã gửi
+        if self.checkpoint:
+            self.checkpoint.set(
+                "stream", {"seq": self.seq, "failed": self.failed}, force=True
+            )
+
+    async def close(self):
+        self.flush()
+        await self._wait_uploads(0)
+
+    def summary(self):
+        return {
+            "streamed": True,
+            "chunks": self.delivered,
+            "failed_chunks": list(self.failed),
+            "items": dict(self.counts),
+        }
@@ -0,0 +1,142 @@
+import asyncio
+from api.tiktok_api import fetch_pending_tasks, update_task_status
+from core.logger import setup_logger
+
+logger = setup_logger()
+
+
+class TaskPrefetcher:
+    """
+    Lease task theo lô và giữ sẵn 1 queue nhỏ ở local.
+
+    - Backend hỗ trợ long-poll (giữ request tới `long_poll` giây) → nhận task
+      gần như ngay khi có.
+    - Backend trả về ngay khi rỗng → backoff tăng dần min_backoff → max_backoff,
+      reset khi có task lại.
+    - Task vừa lease được PATCH "running" ngay (trước khi vào queue local)
+      → backend không trả lại task đó cho worker khác trong lúc nó còn chờ
+      slot. PATCH lỗi → bỏ task, để backend giao lại (không chạy trùng).
+    - stop() trả task còn nằm trong queue (đã "running" nhưng chưa chạy)
+      về "pending" → worker khác nhận, không kẹt "running" mãi.
+    """
+
+    def __init__(
+        self,
+        prefetch=3,
+        long_poll=25,
+        min_backoff=0.5,
+        max_backoff=15,
+    ):
+        self.queue = asyncio.Queue(maxsize=prefetch)
+        self.long_poll = long_poll
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+        self._known = set()   # task_id đang trong queue / đang chạy
+        self._space = asyncio.Event()
+        self._space.set()
+        self._runner = None
+
+    def start(self):
+        self._runner = asyncio.create_task(self._fill_loop())
+        return self
+
+    async def stop(self):
+        if self._runner:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+
+        released = []
+        while not self.queue.empty():
+            released.append(self.queue.get_nowait())
+        await asyncio.gather(*(self._release(task) for task in released))
+
+    async def get(self):
+        task = await self.queue.get()
+        self._space.set()
+        return task
+
+    def done(self, task_id):
+        # task xong (hoặc bị bỏ) → cho phép lease lại nếu backend trả về
+        self._known.discard(task_id)
+
+    async def _claim(self, task):
+        task_id = task.get("_id") if isinstance(task, dict) else None
+        if not task_id:
+            # task hỏng → vẫn đưa vào queue cho main log / bỏ qua
+            self.queue.put_nowait(task)
+            return True
+
+        try:
+            await update_task_status(task_id, "running")
+        except Exception as e:
+            logger.warning(f"⚠️ [{task_id}] mark running failed: {e} — skip")
+            self._known.discard(task_id)
+            return False
+
+        # vào queue ngay khi đã claim → stop() giữa lô vẫn thấy để trả lại
+        self.queue.put_nowait(task)
+        return True
+
+    async def _release(self, task):
+        task_id = task.get("_id") if isinstance(task, dict) else None
+        self._known.discard(task_id)
+        if not task_id:
+            return
+
+        try:
+            await update_task_status(task_id, "pending")
+            logger.info(f"↩️ [{task_id}] released back to backend")
+        except Exception as e:
+            logger.warning(f"⚠️ [{task_id}] release failed: {e}")
+
+    async def _fill_loop(self):
+        loop = asyncio.get_running_loop()
+        backoff = self.min_backoff
+
+        while True:
+            if self.queue.full():
+                self._space.clear()
+                await self._space.wait()
+                continue
+
+            free = self.queue.maxsize - self.queue.qsize()
+            started = loop.time()
+
+            try:
+                tasks = await fetch_pending_tasks(
+                    limit=free, wait=self.long_poll
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Lease task failed: {e} — retry {backoff:.1f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+
+            fresh = []
+            for task in tasks:
+                task_id = task.get("_id") if isinstance(task, dict) else None
+                if task_id in self._known:
+                    continue
+                # backend trả quá limit → phần dư không claim, để lease lại sau
+                if len(fresh) >= free:
+                    break
+                if task_id:
+                    self._known.add(task_id)
+                fresh.append(task)
+
+            claimed = await asyncio.gather(*(self._claim(t) for t in fresh))
+            added = sum(claimed)
+
+            if added:
+                logger.info(f"📦 Leased {added} task(s)")
+                backoff = self.min_backoff
+                continue
+
+            # backend đã giữ request (long-poll) → hỏi lại ngay
+            if loop.time() - started >= self.long_poll * 0.8:
+                continue
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
@@ -1,37 +1,194 @@
-import requests
+import asyncio
+import os
+import random
+import socket
+import time
+import httpx
+from core import metrics
 
 # API_BASE = "http://localhost:3000/api/tiktok"
 
-API_BASE = "https://be-tool-crawldata.onrender.com/api/tiktok"
+API_BASE = os.getenv(
+    "TIKTOK_API_BASE",
+    "https://be-tool-crawldata.onrender.com/api/tiktok"
+)
 
+REQUEST_TIMEOUT = 10
+MAX_RETRIES = 4
+RETRY_BASE_DELAY = 0.5       # giây, nhân đôi mỗi lần + jitter
+RETRY_STATUS = {429, 500, 502, 503, 504}
 
-def fetch_pending_task():
-    res = requests.get(f"{API_BASE}/task/pending", timeout=10)
-    res.raise_for_status()
-    data = res.json()
+# định danh worker gửi kèm khi lease task
+WORKER_ID = os.getenv("WORKER_ID", f"{socket.gethostname()}-{os.getpid()}")
 
-    # Không có task
-    if not data:
-        return None
+# HTTP/2 chỉ bật khi có package h2 (httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
 
-    # Nếu là list → lấy task đầu tiên
-    if isinstance(data, list):
-        return data[0] if data else None
 
-    # Nếu có wrapper { data: {...} }
-    if isinstance(data, dict) and "data" in data:
-        return data["data"]
+class TaskApiError(Exception):
+    pass
 
-    # Nếu là object task
-    return data
 
-def update_task_status(task_id, status, result=None):
-    payload = {"status": status}
-    if result is not None:
-        payload["result"] = result
+class TikTokApiClient:
+    """
+    Client async dùng chung cho mọi worker: giữ kết nối keep-alive,
+    retry lỗi mạng / 5xx với backoff có jitter.
+    """
 
-    requests.patch(
-        f"{API_BASE}/task/{task_id}",
-        json=payload,
-        timeout=10
-    )
\ No newline at end of file
+    def __init__(self, base_url=API_BASE, timeout=REQUEST_TIMEOUT,
+                 max_connections=10):
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            http2=HTTP2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+
+    async def request(self, method, path, **kwargs):
+        for attempt in range(1, MAX_RETRIES + 1):
+            started = time.perf_counter()
+            try:
+                res = await self._client.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                error = e
+                self._record(method, "error", started)
+            else:
+                self._record(method, res.status_code, started)
+
+                if res.status_code not in RETRY_STATUS:
+                    try:
+                        res.raise_for_status()
+                    except httpx.HTTPStatusError as e:
+                        raise TaskApiError(
+                            f"{method} {path} → HTTP {res.status_code}"
+                        ) from e
+                    return res
+
+                error = httpx.HTTPStatusError(
+                    f"HTTP {res.status_code}", request=res.request, response=res
+                )
+
+            if attempt == MAX_RETRIES:
+                raise TaskApiError(
+                    f"{method} {path} failed after {attempt} tries: {error}"
+                ) from error
+
+            # full jitter: tránh nhiều worker retry cùng lúc
+            delay = RETRY_BASE_DELAY * 2 ** (attempt - 1)
+            await asyncio.sleep(random.uniform(0, delay))
+
+    @staticmethod
+    def _record(method, status, started):
+        seconds = time.perf_counter() - started
+        metrics.REGISTRY.backend_call(method, status, seconds)
+        metrics.observe("backend", seconds)
+
+    async def fetch_pending_task(self):
+        res = await self.request("GET", "/task/pending")
+        data = res.json()
+
+        # Không có task
+        if not data:
+            return None
+
+        # Nếu là list → lấy task đầu tiên
+        if isinstance(data, list):
+            return data[0] if data else None
+
+        # Nếu có wrapper { data: {...} }
+        if isinstance(data, dict) and "data" in data:
+            return data["data"]
+
+        # Nếu là object task
+        return data
+
+    async def fetch_pending_tasks(self, limit=1, wait=0):
+        """
+        Lease tối đa `limit` task / request.
+        wait > 0 → long-poll: backend giữ request tới khi có task hoặc hết wait.
+        """
+        params = {"limit": limit, "worker_id": WORKER_ID}
+        if wait:
+            params["wait"] = wait
+
+        res = await self.request(
+            "GET",
+            "/task/pending",
+            params=params,
+            timeout=REQUEST_TIMEOUT + wait,
+        )
+        data = res.json()
+
+        if isinstance(data, dict) and "data" in data:
+            data = data["data"]
+
+        if not data:
+            return []
+
+        if isinstance(data, list):
+            return data
+
+        return [data]
+
+    async def update_task_status(self, task_id, status, result=None,
+                                 task_metrics=None):
+        payload = {"status": status}
+        if result is not None:
+            payload["result"] = result
+        if task_metrics is not None:
+            payload["metrics"] = task_metrics
+
+        await self.request("PATCH", f"/task/{task_id}", json=payload)
+
+    async def upload_result_chunk(self, task_id, seq, stream, items):
+        await self.request(
+            "POST",
+            f"/task/{task_id}/chunk",
+            json={"seq": seq, "stream": stream, "items": items},
+        )
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = TikTokApiClient()
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def fetch_pending_task():
+    return await get_client().fetch_pending_task()
+
+
+async def fetch_pending_tasks(limit=1, wait=0):
+    return await get_client().fetch_pending_tasks(limit, wait)
+
+
+async def update_task_status(task_id, status, result=None, task_metrics=None):
+    # lỗi HTTP → raise TaskApiError (không còn nuốt lỗi im lặng)
+    await get_client().update_task_status(
+        task_id, status, result, task_metrics
+    )
+
+
+async def upload_result_chunk(task_id, seq, stream, items):
+    await get_client().upload_result_chunk(task_id, seq, stream, items)
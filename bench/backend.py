@@ -0,0 +1,168 @@
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+from bench.server import LocalServer
+
+# ===========================
+# LOCAL TASK BACKEND STAND-IN
+# Cùng route mà api/tiktok_api.py gọi:
+#   GET   .../task/pending?limit=&worker_id=&wait=
+#   PATCH .../task/{id}          {"status", "result"}
+#   POST  .../task/{id}/chunk    {"seq", "stream", "items"}
+# ===========================
+
+
+class TaskBoard:
+    def __init__(self):
+        self.tasks = {}          # id -> task (kèm status, result, chunks)
+        self._ids = itertools.count(1)
+        self._changed = threading.Condition()
+
+    def add(self, scan_type, input_data, timeout=None):
+        with self._changed:
+            task_id = f"bench-{next(self._ids)}"
+            self.tasks[task_id] = {
+                "_id": task_id,
+                "scan_type": scan_type,
+                "input": input_data,
+                "timeout": timeout,
+                "status": "pending",
+                "result": None,
+                "chunks": [],
+            }
+            self._changed.notify_all()
+            return task_id
+
+    def lease(self, limit, wait):
+        deadline = time.monotonic() + wait
+        with self._changed:
+            while True:
+                pending = [
+                    t for t in self.tasks.values() if t["status"] == "pending"
+                ][:limit]
+                remaining = deadline - time.monotonic()
+                if pending or remaining <= 0:
+                    break
+                # long-poll: giữ request tới khi có task hoặc hết wait
+                self._changed.wait(remaining)
+
+            for task in pending:
+                task["status"] = "leased"
+
+            return [
+                {k: task[k] for k in ("_id", "scan_type", "input", "timeout")}
+                for task in pending
+            ]
+
+    def update(self, task_id, status, result=None):
+        with self._changed:
+            task = self.tasks.get(task_id)
+            if not task:
+                return False
+            task["status"] = status
+            if result is not None:
+                task["result"] = result
+            self._changed.notify_all()
+            return True
+
+    def add_chunk(self, task_id, chunk):
+        with self._changed:
+            task = self.tasks.get(task_id)
+            if not task:
+                return False
+            task["chunks"].append(chunk)
+            return True
+
+
+_TASK_PATH = re.compile(r".*/task/(?P<id>[^/]+)(?P<chunk>/chunk)?/?$")
+
+
+class BackendHandler(BaseHTTPRequestHandler):
+    board = None
+    stats = None
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, payload=None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.stats["requests"] += 1
+        self.stats["bytes"] += len(data)
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        self.stats["bytes"] += len(raw)
+        return json.loads(raw or b"{}")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        m = _TASK_PATH.match(url.path)
+        if not m or m.group("id") != "pending":
+            return self._reply(404, {"error": "not found"})
+
+        q = parse_qs(url.query)
+        limit = int(q.get("limit", ["1"])[0])
+        wait = float(q.get("wait", ["0"])[0])
+        self._reply(200, self.board.lease(limit, wait))
+
+    def do_PATCH(self):
+        m = _TASK_PATH.match(urlparse(self.path).path)
+        if not m or m.group("chunk"):
+            return self._reply(404, {"error": "not found"})
+
+        body = self._body()
+        ok = self.board.update(m.group("id"), body.get("status"),
+                               body.get("result"))
+        self._reply(200 if ok else 404, {"ok": ok})
+
+    def do_POST(self):
+        m = _TASK_PATH.match(urlparse(self.path).path)
+        if not m or not m.group("chunk"):
+            return self._reply(404, {"error": "not found"})
+
+        ok = self.board.add_chunk(m.group("id"), self._body())
+        self._reply(200 if ok else 404, {"ok": ok})
+
+
+def start_backend(board=None, port=0):
+    board = board or TaskBoard()
+    handler = type("BenchBackendHandler", (BackendHandler,), {"board": board})
+    server = LocalServer(handler, port).start()
+    server.board = board
+    return server
+
+
+if __name__ == "__main__":
+    # chạy worker thật với backend giả:
+    #   python -m bench.backend --port 3000 --task users '{"keyword": "cafe"}'
+    #   TIKTOK_API_BASE=http://127.0.0.1:3000/api/tiktok python main.py
+    parser = argparse.ArgumentParser(description="Local task backend stand-in")
+    parser.add_argument("--port", type=int, default=3000)
+    parser.add_argument(
+        "--task", nargs=2, action="append", default=[],
+        metavar=("SCAN_TYPE", "INPUT_JSON"),
+    )
+    args = parser.parse_args()
+
+    server = start_backend(port=args.port)
+    for scan_type, input_json in args.task:
+        server.board.add(scan_type, json.loads(input_json))
+
+    print(f"🧪 Task backend: {server.url}/api/tiktok")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,405 @@
+import json
+import random
+import zlib
+
+# ===========================
+# FIXTURE DATA
+# Payload cùng shape với response TikTok đã ghi lại
+# (__UNIVERSAL_DATA_FOR_REHYDRATION__, /api/search, /api/user/list,
+# /api/comment/list) – sinh tất định theo key để chạy lại ra cùng số liệu.
+# ===========================
+
+VIDEO_ID_BASE = 7_300_000_000_000_000_000
+
+
+def _rng(*key):
+    return random.Random(zlib.crc32("|".join(map(str, key)).encode()))
+
+
+def format_count(n):
+    # giống cách TikTok hiện số trên card: 1.2M / 15.3K / 999
+    if n >= 1_000_000:
+        return f"{n / 1_000_000:.1f}M"
+    if n >= 1_000:
+        return f"{n / 1_000:.1f}K"
+    return str(n)
+
+
+def user_record(username):
+    rng = _rng("user", username)
+    return {
+        "id": str(rng.randrange(10 ** 17, 10 ** 18)),
+        "uniqueId": username,
+        "nickname": username.replace("_", " ").title(),
+        "signature": f"Bio của {username} | contact: {username}@mail.vn",
+        "avatarLarger": f"https://p16-sign.tiktokcdn.com/{username}.jpeg",
+        "verified": rng.random() < 0.1,
+        "bioLink": {"link": f"https://linktr.ee/{username}"}
+        if rng.random() < 0.3 else None,
+    }
+
+
+def user_stats(username):
+    rng = _rng("stats", username)
+    return {
+        "followerCount": rng.randrange(100, 5_000_000),
+        "followingCount": rng.randrange(10, 3_000),
+        "videoCount": rng.randrange(1, 1_500),
+        "heartCount": rng.randrange(1_000, 90_000_000),
+    }
+
+
+def search_video_ids(keyword, total):
+    base = VIDEO_ID_BASE + zlib.crc32(keyword.encode()) * 1_000
+    return [str(base + i) for i in range(total)]
+
+
+def video_item(video_id):
+    rng = _rng("video", video_id)
+    author = f"creator_{rng.randrange(500)}"
+    plays = rng.randrange(1_000, 20_000_000)
+    return {
+        "id": video_id,
+        "desc": f"Video {video_id} #bench",
+        "createTime": 1_700_000_000 + rng.randrange(10_000_000),
+        "author": {
+            "id": user_record(author)["id"],
+            "uniqueId": author,
+            "nickname": user_record(author)["nickname"],
+        },
+        "stats": {"playCount": plays},
+        "statsV2": {
+            "playCount": str(plays),
+            "diggCount": str(int(plays * rng.uniform(0.01, 0.2))),
+            "commentCount": str(int(plays * rng.uniform(0.0005, 0.01))),
+            "shareCount": str(int(plays * rng.uniform(0.0005, 0.02))),
+            "collectCount": str(int(plays * rng.uniform(0.001, 0.03))),
+        },
+    }
+
+
+def search_usernames(keyword, total):
+    return [f"{keyword}_user_{i}" for i in range(total)]
+
+
+def relation_usernames(username, scene, total):
+    # follower = user 0..total-1, following lệch nửa list → có friend chung
+    start = 0 if scene == "follower" else total // 2
+    return [f"{username}_fan_{i}" for i in range(start, start + total)]
+
+
+def comment_item(video_id, index):
+    rng = _rng("comment", video_id, index)
+    username = f"viewer_{rng.randrange(5_000)}"
+    return {
+        "cid": str(int(video_id) + 10 ** 6 + index),
+        "text": f"Comment #{index} cho video {video_id}",
+        "create_time": 1_700_000_000 + index * 60,
+        "digg_count": rng.randrange(0, 5_000),
+        "reply_comment_total": rng.randrange(0, 40),
+        "reply_id": "0",
+        "user": {
+            "uid": user_record(username)["id"],
+            "unique_id": username,
+            "nickname": user_record(username)["nickname"],
+        },
+    }
+
+
+# ===========================
+# JSON ENDPOINTS
+# ===========================
+
+def page_slice(items, cursor, count):
+    chunk = items[cursor:cursor + count]
+    return chunk, cursor + len(chunk), cursor + len(chunk) < len(items)
+
+
+def search_video_page(keyword, cursor, count, total):
+    ids, next_cursor, has_more = page_slice(
+        search_video_ids(keyword, total), cursor, count
+    )
+    return {
+        "item_list": [video_item(i) for i in ids],
+        "has_more": int(has_more),
+        "cursor": next_cursor,
+    }
+
+
+def search_user_page(keyword, cursor, count, total):
+    names, next_cursor, has_more = page_slice(
+        search_usernames(keyword, total), cursor, count
+    )
+    return {
+        "user_list": [
+            {"user_info": user_record(n), "stats": user_stats(n)} for n in names
+        ],
+        "has_more": int(has_more),
+        "cursor": next_cursor,
+    }
+
+
+def user_list_page(username, scene, cursor, count, total):
+    names, next_cursor, has_more = page_slice(
+        relation_usernames(username, scene, total), cursor, count
+    )
+    return {
+        "userList": [
+            {"user": user_record(n), "stats": user_stats(n)} for n in names
+        ],
+        "hasMore": has_more,
+        "minCursor": next_cursor,
+    }
+
+
+def comment_page(video_id, cursor, count, total):
+    indexes, next_cursor, has_more = page_slice(
+        list(range(total)), cursor, count
+    )
+    return {
+        "comments": [comment_item(video_id, i) for i in indexes],
+        "has_more": int(has_more),
+        "cursor": next_cursor,
+    }
+
+
+# ===========================
+# HTML PAGES
+# ===========================
+
+_SHELL = """<!doctype html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body {{ margin: 0; font-family: sans-serif; }}
+.card {{ display: block; height: 320px; border-bottom: 1px solid #ddd; }}
+.scroll {{ height: 420px; overflow-y: auto; }}
+.row {{ height: 60px; }}
+</style>
+{hydration}
+</head><body>
+{body}
+<script>
+const PAGE_SIZE = {page_size};
+{script}
+</script>
+</body></html>
+"""
+
+
+def _hydration(scope):
+    data = json.dumps({"__DEFAULT_SCOPE__": scope}, ensure_ascii=False)
+    return (
+        '<script id="__UNIVERSAL_DATA_FOR_REHYDRATION__" '
+        f'type="application/json">{data}</script>'
+    )
+
+
+def _page(title, body, script, page_size, hydration=""):
+    return _SHELL.format(
+        title=title,
+        hydration=hydration,
+        body=body,
+        script=script,
+        page_size=page_size,
+    )
+
+
+# cuộn gần đáy window / element → gọi API trang kế (giống infinite scroll)
+_INFINITE_JS = """
+function infinite(target, load) {
+    let busy = false;
+    const onScroll = async () => {
+        const el = target === window ? document.documentElement : target;
+        const bottom = el.scrollTop + el.clientHeight >= el.scrollHeight - 200;
+        if (busy || !bottom || !state.hasMore) return;
+        busy = true;
+        try { await load(); } finally { busy = false; }
+    };
+    target.addEventListener('scroll', onScroll, {passive: true});
+}
+"""
+
+
+def search_video_html(keyword, page_size, total):
+    first = search_video_page(keyword, 0, page_size, total)
+    script = _INFINITE_JS + """
+const state = {cursor: %d, hasMore: %s};
+const feed = document.querySelector("[data-e2e='search_video-item-list']");
+const fmt = (n) => n >= 1e6 ? (n / 1e6).toFixed(1) + 'M'
+    : n >= 1e3 ? (n / 1e3).toFixed(1) + 'K' : String(n);
+
+infinite(window, async () => {
+    const res = await fetch(
+        `/api/search/item_full/?keyword=%s&offset=${state.cursor}&count=${PAGE_SIZE}`
+    );
+    const data = await res.json();
+    for (const item of data.item_list) {
+        feed.insertAdjacentHTML('beforeend',
+            `<div class="card"><a href="/@${item.author.uniqueId}/video/${item.id}">` +
+            `<img src="https://p16-sign.tiktokcdn.com/${item.id}.jpeg">` +
+            `<strong data-e2e="video-views">${fmt(item.stats.playCount)}</strong>` +
+            `</a></div>`);
+    }
+    state.cursor = data.cursor;
+    state.hasMore = !!data.has_more;
+});
+""" % (first["cursor"], json.dumps(bool(first["has_more"])), keyword)
+
+    cards = "".join(
+        f'<div class="card"><a href="/@{v["author"]["uniqueId"]}/video/{v["id"]}">'
+        f'<img src="https://p16-sign.tiktokcdn.com/{v["id"]}.jpeg">'
+        f'<strong data-e2e="video-views">'
+        f'{format_count(v["stats"]["playCount"])}</strong></a></div>'
+        for v in first["item_list"]
+    )
+    body = f'<div data-e2e="search_video-item-list">{cards}</div>'
+    return _page(f"{keyword} | TikTok Search", body, script, page_size)
+
+
+def search_user_html(keyword, page_size, total):
+    first = search_user_page(keyword, 0, page_size, total)
+    script = _INFINITE_JS + """
+const state = {cursor: %d, hasMore: %s};
+const list = document.querySelector("#user-list");
+
+infinite(window, async () => {
+    const res = await fetch(
+        `/api/search/user/full/?keyword=%s&offset=${state.cursor}&count=${PAGE_SIZE}`
+    );
+    const data = await res.json();
+    for (const u of data.user_list) {
+        list.insertAdjacentHTML('beforeend',
+            `<div class="card"><a href="/@${u.user_info.uniqueId}">` +
+            `<p>${u.user_info.nickname}</p>` +
+            `<p>${u.stats.followerCount} Followers</p></a></div>`);
+    }
+    state.cursor = data.cursor;
+    state.hasMore = !!data.has_more;
+});
+""" % (first["cursor"], json.dumps(bool(first["has_more"])), keyword)
+
+    cards = "".join(
+        f'<div class="card"><a href="/@{u["user_info"]["uniqueId"]}">'
+        f'<p>{u["user_info"]["nickname"]}</p>'
+        f'<p>{format_count(u["stats"]["followerCount"])} Followers</p></a></div>'
+        for u in first["user_list"]
+    )
+    body = f'<div id="user-list">{cards}</div>'
+    return _page(f"{keyword} | TikTok Search", body, script, page_size)
+
+
+def profile_html(username, page_size):
+    user = user_record(username)
+    stats = user_stats(username)
+    hydration = _hydration({
+        "webapp.user-detail": {"userInfo": {"user": user, "stats": stats}},
+    })
+
+    script = _INFINITE_JS + """
+const state = {scene: null, cursor: 0, hasMore: false};
+const popup = document.querySelector("[data-e2e='follow-info-popup']");
+const box = popup.querySelector("div[class*='DivUserListContainer']");
+const list = box.querySelector("ul");
+
+async function load() {
+    const res = await fetch(
+        `/api/user/list/?uniqueId=%s&scene=${state.scene}` +
+        `&minCursor=${state.cursor}&count=${PAGE_SIZE}`
+    );
+    const data = await res.json();
+    for (const entry of data.userList) {
+        list.insertAdjacentHTML('beforeend',
+            `<li class="row"><a href="/@${entry.user.uniqueId}">` +
+            `${entry.user.nickname}</a></li>`);
+    }
+    state.cursor = data.minCursor;
+    state.hasMore = data.hasMore;
+}
+
+function open(scene) {
+    popup.style.display = 'block';
+    if (state.scene === scene) return;
+    state.scene = scene;
+    state.cursor = 0;
+    state.hasMore = true;
+    list.innerHTML = '';
+    load();
+}
+
+document.querySelector("[data-e2e='followers-count']")
+    .addEventListener('click', () => open('follower'));
+document.querySelector("[data-e2e='following-count']")
+    .addEventListener('click', () => open('following'));
+popup.querySelector("strong[title='Followers']")
+    .addEventListener('click', () => open('follower'));
+popup.querySelector("strong[title='Following']")
+    .addEventListener('click', () => open('following'));
+infinite(box, load);
+""" % username
+
+    body = f"""
+<h1 data-e2e="user-title">{user["uniqueId"]}</h1>
+<h2 data-e2e="user-subtitle">{user["nickname"]}</h2>
+<h2 data-e2e="user-bio">{user["signature"]}</h2>
+<strong data-e2e="following-count">{format_count(stats["followingCount"])}</strong>
+<strong data-e2e="followers-count">{format_count(stats["followerCount"])}</strong>
+<strong data-e2e="likes-count">{format_count(stats["heartCount"])}</strong>
+<div data-e2e="follow-info-popup" style="display:none">
+  <strong title="Followers">Followers</strong>
+  <strong title="Following">Following</strong>
+  <div class="DivUserListContainer-bench scroll"><ul></ul></div>
+</div>
+"""
+    return _page(f"@{username} | TikTok", body, script, page_size, hydration)
+
+
+def video_html(username, video_id, page_size):
+    item = video_item(video_id)
+    item["author"]["uniqueId"] = username
+    hydration = _hydration({
+        "webapp.video-detail": {"itemInfo": {"itemStruct": item}},
+    })
+
+    script = _INFINITE_JS + """
+const state = {cursor: 0, hasMore: true};
+let panel = null;
+
+async function load() {
+    const res = await fetch(
+        `/api/comment/list/?aweme_id=%s&cursor=${state.cursor}&count=${PAGE_SIZE}`
+    );
+    const data = await res.json();
+    for (const c of data.comments) {
+        panel.insertAdjacentHTML('beforeend',
+            `<div class="DivCommentObjectWrapper-bench row">` +
+            `<a href="/@${c.user.unique_id}"></a>` +
+            `<span data-e2e="comment-username-1"><p>${c.user.nickname}</p></span>` +
+            `<p data-e2e="comment-level-1"><span>${c.text}</span></p>` +
+            `<div class="DivCommentSubContentWrapper-bench"><span>1d ago</span></div>` +
+            `<div class="DivLikeContainer-bench"><span>${c.digg_count}</span></div>` +
+            `</div>`);
+    }
+    state.cursor = data.cursor;
+    state.hasMore = !!data.has_more;
+}
+
+document.querySelector("[data-e2e='comment-icon']").addEventListener('click', () => {
+    if (panel) return;
+    document.body.insertAdjacentHTML('beforeend',
+        '<div class="DivCommentMain-bench scroll"></div>');
+    panel = document.querySelector("div[class*='DivCommentMain']");
+    infinite(panel, load);
+    load();
+});
+""" % video_id
+
+    stats = item["statsV2"]
+    body = f"""
+<h1>{item["desc"]}</h1>
+<a href="/@{username}">{username}</a>
+<strong data-e2e="like-count">{format_count(int(stats["diggCount"]))}</strong>
+<strong data-e2e="comment-count">{format_count(int(stats["commentCount"]))}</strong>
+<strong data-e2e="share-count">{format_count(int(stats["shareCount"]))}</strong>
+<div data-e2e="comment-icon" style="width:48px;height:48px">💬</div>
+"""
+    return _page(f"Video {video_id} | TikTok", body, script, page_size, hydration)
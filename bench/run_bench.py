@@ -0,0 +1,238 @@
+"""
+Benchmark crawler với TikTok giả chạy local (không đụng tiktok.com).
+
+    python -m bench.run_bench --latency-ms 50 --page-size 12 --items 60
+    python -m bench.run_bench --scan users --scan relations --out bench.json
+
+Mỗi scan_type trong SCAN_DISPATCHER chạy đủ vòng:
+lease task từ backend giả → dispatch_scan → PATCH kết quả,
+rồi in items/s, số lệnh Playwright / item, request / byte và wall time.
+
+Baseline đã commit (cấu hình mặc định, Chrome Headless Shell – xem "browser"):
+    bench/baseline/api.json   python -m bench.run_bench --out ...
+    bench/baseline/dom.json   ... --extract-mode dom --dom-window 12
+Mode DOM: relations / video_comments phải lấy đủ limit (> 1 trang PAGE_SIZE)
+→ chứng minh cuộn qua màn hình đầu, kể cả khi prune DOM.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from api.tiktok_api import TikTokApiClient
+from bench.backend import start_backend
+from bench.server import BenchConfig, start_tiktok_server
+from core import metrics
+from core.browser import get_resource_blocker, launch_browser, new_context
+from core.page_pool import WarmPagePool, close_page, open_page
+from core.rate_limiter import SessionLimiter
+from dispatch.scan_dispatcher import SCAN_DISPATCHER, dispatch_scan
+
+TIKTOK_ORIGIN = "https://www.tiktok.com"
+
+# rate bench mặc định: đủ cao để đo crawler, không đo nhịp chờ của limiter
+BENCH_RATE = 1000.0
+
+
+def bench_inputs(items, extract_mode="api", dom_window=0):
+    # extract_mode="dom" → relations / video_comments bỏ API, cuộn DOM
+    dom = {"extract_mode": extract_mode, "dom_window": dom_window}
+    return {
+        "top_posts": {
+            "keyword": "bench",
+            "limit": items,
+            "deep_scan": True,
+        },
+        "users": {
+            "keyword": "bench",
+            "limit": items,
+            "deep_scan": True,
+        },
+        "relations": {
+            "target_username": "bench_target",
+            "followers_limit": items,
+            "following_limit": items,
+            "friends_limit": max(1, items // 4),
+            **dom,
+        },
+        "video_comments": {
+            "video_url": f"{TIKTOK_ORIGIN}/@bench_creator/video/7300000000000000001",
+            "limit_comments": items,
+            **dom,
+        },
+    }
+
+
+def _bench_limiter(pacing):
+    limiter = SessionLimiter("bench")
+    if not pacing:
+        for bucket in limiter.buckets.values():
+            bucket.rate = bucket.max_rate = BENCH_RATE
+    return limiter
+
+
+# ===========================
+# CHẠY 1 SCAN
+# ===========================
+
+async def run_scan(context, client, backend, scan_type, input_data, limiter):
+    # stage / lệnh Playwright / request được đếm qua core.metrics
+    with metrics.track_task(scan_type=scan_type) as task_metrics:
+        return await _run_scan(
+            context, client, backend, scan_type, input_data, limiter,
+            task_metrics,
+        )
+
+
+async def _run_scan(context, client, backend, scan_type, input_data, limiter,
+                    task_metrics):
+    backend.board.add(scan_type, input_data)
+
+    started = time.perf_counter()
+    tasks = await client.fetch_pending_tasks(limit=1)
+    task = tasks[0]
+
+    page = await open_page(context)
+    blocker = get_resource_blocker(context)
+
+    error = None
+    result = None
+    try:
+        result = await dispatch_scan(
+            scan_type, page, task["input"], rate_limiter=limiter
+        )
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        saved = blocker.release_page(page) if blocker else {}
+        await close_page(context, page, reusable=not error)
+
+    await client.update_task_status(
+        task["_id"],
+        "error" if error else "success",
+        {"error": error} if error else result,
+    )
+
+    wall = time.perf_counter() - started
+    items = metrics.count_items(result)
+    calls = task_metrics.counters.get("playwright_calls", 0)
+    stages = task_metrics.summary()["stages"]
+    return {
+        "scan_type": scan_type,
+        "items": items,
+        "wall_s": round(wall, 2),
+        "items_per_s": round(items / wall, 2) if wall else 0.0,
+        "playwright_calls": calls,
+        "calls_per_item": round(calls / items, 1) if items else None,
+        "backend_s": stages.get("backend", {}).get("seconds", 0.0),
+        "blocked_requests": saved.get("blocked_requests", 0),
+        "stages": stages,
+        "error": error,
+    }
+
+
+async def run(args):
+    config = BenchConfig(
+        latency_ms=args.latency_ms,
+        page_size=args.page_size,
+        total=args.items,
+    )
+    tiktok = start_tiktok_server(config)
+    backend = start_backend()
+    client = TikTokApiClient(base_url=f"{backend.url}/api/tiktok")
+
+    # cache profile / result store / checkpoint ghi vào thư mục tạm
+    workdir = tempfile.mkdtemp(prefix="tiktok-bench-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+
+    metrics.instrument_playwright()
+
+    playwright, browser = await launch_browser(headless=not args.headed)
+    browser_version = browser.version
+    try:
+        context = await new_context(browser, fetch_profile=args.fetch_profile)
+
+        # mọi request tới tiktok.com → server local (giữ nguyên URL trong page)
+        async def to_local(route):
+            url = route.request.url.replace(TIKTOK_ORIGIN, tiktok.url, 1)
+            response = await route.fetch(url=url)
+            await route.fulfill(response=response)
+
+        await context.route(f"{TIKTOK_ORIGIN}/**", to_local)
+
+        pages = None
+        if args.warm_pages:
+            pages = await WarmPagePool(context, size=args.warm_pages).start()
+
+        inputs = bench_inputs(args.items, args.extract_mode, args.dom_window)
+        reports = []
+        for scan_type in args.scan or list(SCAN_DISPATCHER):
+            requests_before = tiktok.stats["requests"]
+            bytes_before = tiktok.stats["bytes"]
+
+            report = await run_scan(
+                context, client, backend, scan_type, inputs[scan_type],
+                _bench_limiter(args.pacing),
+            )
+            report["requests"] = tiktok.stats["requests"] - requests_before
+            report["bytes"] = tiktok.stats["bytes"] - bytes_before
+            reports.append(report)
+
+            print(
+                f"{scan_type:<15} {report['items']:>5} items "
+                f"{report['wall_s']:>8.2f}s {report['items_per_s']:>7.2f} it/s "
+                f"{report['playwright_calls']:>6} pw calls "
+                f"({report['calls_per_item']} / item) "
+                f"{report['requests']:>4} req {report['bytes'] / 1000:>8.1f} KB"
+                + (f"  ❌ {report['error']}" if report["error"] else "")
+            )
+
+        if pages:
+            await pages.close()
+        await context.close()
+    finally:
+        await browser.close()
+        await playwright.stop()
+        await client.aclose()
+        tiktok.stop()
+        backend.stop()
+        os.chdir(cwd)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({
+                "config": vars(args),
+                "browser": browser_version,
+                "reports": reports,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"💾 Saved: {args.out}")
+
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TikTok crawler benchmark")
+    parser.add_argument("--scan", action="append", choices=list(SCAN_DISPATCHER),
+                        help="scan_type cần chạy (mặc định: tất cả)")
+    parser.add_argument("--latency-ms", type=int, default=50)
+    parser.add_argument("--page-size", type=int, default=12)
+    parser.add_argument("--items", type=int, default=60,
+                        help="tổng item mỗi list giả + limit của task")
+    parser.add_argument("--fetch-profile", default="data_only")
+    parser.add_argument("--extract-mode", choices=["api", "dom"], default="api",
+                        help="relations / video_comments: bắt API hay cuộn DOM")
+    parser.add_argument("--dom-window", type=int, default=0,
+                        help="mode DOM: số item giữ lại trong DOM (0 = giữ hết)")
+    parser.add_argument("--pacing", action="store_true",
+                        help="giữ nhịp rate limiter thật (mặc định bỏ qua)")
+    parser.add_argument("--warm-pages", type=int, default=0,
+                        help="số page nóng dùng lại giữa các scan (0 = page mới mỗi scan)")
+    parser.add_argument("--headed", action="store_true")
+    parser.add_argument("--out", help="ghi báo cáo JSON")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from bench import fixtures
+
+# ===========================
+# LOCAL TIKTOK STAND-IN
+# ===========================
+
+
+class BenchConfig:
+    def __init__(self, latency_ms=50, page_size=12, total=60):
+        self.latency_ms = latency_ms    # trễ thêm cho mỗi request
+        self.page_size = page_size      # item / trang API
+        self.total = total              # tổng item mỗi list (search, follower...)
+
+
+def _arg(query, name, default=None):
+    return query.get(name, [default])[0]
+
+
+def _int(query, name, default=0):
+    try:
+        return int(_arg(query, name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class TikTokHandler(BaseHTTPRequestHandler):
+    config = BenchConfig()
+    stats = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type):
+        data = body.encode("utf-8")
+        self.stats["requests"] += 1
+        self.stats["bytes"] += len(data)
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _json(self, payload):
+        self._send(200, json.dumps(payload, ensure_ascii=False),
+                   "application/json")
+
+    def _html(self, html):
+        self._send(200, html, "text/html; charset=utf-8")
+
+    def do_GET(self):
+        cfg = self.config
+        if cfg.latency_ms:
+            time.sleep(cfg.latency_ms / 1000)
+
+        url = urlparse(self.path)
+        path = url.path
+        q = parse_qs(url.query)
+        count = _int(q, "count", cfg.page_size) or cfg.page_size
+
+        if path == "/":
+            # trang chủ – page pool warm / reset về đây
+            return self._html("<html><body></body></html>")
+
+        if path == "/search/video":
+            return self._html(fixtures.search_video_html(
+                _arg(q, "q", ""), cfg.page_size, cfg.total
+            ))
+
+        if path == "/search/user":
+            return self._html(fixtures.search_user_html(
+                _arg(q, "q", ""), cfg.page_size, cfg.total
+            ))
+
+        if path == "/api/search/item_full/":
+            return self._json(fixtures.search_video_page(
+                _arg(q, "keyword", ""), _int(q, "offset"), count, cfg.total
+            ))
+
+        if path == "/api/search/user/full/":
+            return self._json(fixtures.search_user_page(
+                _arg(q, "keyword", ""), _int(q, "offset"), count, cfg.total
+            ))
+
+        if path == "/api/user/list/":
+            return self._json(fixtures.user_list_page(
+                _arg(q, "uniqueId", ""),
+                _arg(q, "scene", "follower"),
+                _int(q, "minCursor"),
+                count,
+                cfg.total,
+            ))
+
+        if path == "/api/comment/list/":
+            return self._json(fixtures.comment_page(
+                _arg(q, "aweme_id", "0"), _int(q, "cursor"), count, cfg.total
+            ))
+
+        m = re.fullmatch(r"/@([^/]+)/video/(\d+)/?", path)
+        if m:
+            return self._html(
+                fixtures.video_html(m.group(1), m.group(2), cfg.page_size)
+            )
+
+        m = re.fullmatch(r"/@([^/]+)/?", path)
+        if m:
+            return self._html(fixtures.profile_html(m.group(1), cfg.page_size))
+
+        self._send(404, "not found", "text/plain")
+
+
+class LocalServer:
+    """Chạy 1 ThreadingHTTPServer trong thread nền (127.0.0.1, port ngẫu nhiên)"""
+
+    def __init__(self, handler, port=0):
+        self.stats = {"requests": 0, "bytes": 0}
+        handler = type(handler.__name__, (handler,), {"stats": self.stats})
+        self.handler = handler
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, daemon=True
+        )
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_tiktok_server(config, port=0):
+    handler = type("BenchTikTokHandler", (TikTokHandler,), {"config": config})
+    return LocalServer(handler, port).start()
@@ -1,11 +1,137 @@
+import asyncio
 import os
+import weakref
+from urllib.parse import urlparse
 from playwright.async_api import async_playwright
+from core.logger import setup_logger
 
+logger = setup_logger()
 
-async def create_browser(headless=True, session_file=None):
-    playwright = await async_playwright().start()
 
-    browser = await playwright.chromium.launch(
+# ===========================
+# FETCH PROFILE (chặn resource không cần)
+# ===========================
+
+# host analytics / tracking – không ảnh hưởng JSON, text
+TRACKER_HOSTS = (
+    "analytics.tiktok.com",
+    "mon.tiktokv.com",
+    "mon-va.byteoversea.com",
+    "mcs-va.tiktokv.com",
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "connect.facebook.net",
+)
+
+FETCH_PROFILES = {
+    "full": None,
+    "data_only": {
+        "block_types": {"media", "image", "font"},
+        "block_hosts": TRACKER_HOSTS,
+    },
+}
+
+# ước lượng dung lượng 1 request bị chặn (không tải nên không biết chính xác)
+EST_BYTES = {
+    "media": 1_500_000,
+    "image": 40_000,
+    "font": 30_000,
+}
+EST_BYTES_OTHER = 10_000
+
+
+class ResourceBlocker:
+    def __init__(self, profile):
+        self.block_types = set(profile["block_types"])
+        self.block_hosts = tuple(profile["block_hosts"])
+        self.total = {"blocked_requests": 0, "bytes_saved": 0}
+        self._pages = weakref.WeakKeyDictionary()
+
+    def bind_page(self, page):
+        # reset thống kê cho task đang dùng page
+        # (mọi scan đọc data từ hydration / API / text, thumbnail / avatar
+        # chỉ cần URL trong src → không scan nào cần tải loại bị chặn)
+        self._pages[page] = {
+            "blocked_requests": 0,
+            "bytes_saved": 0,
+        }
+
+    def release_page(self, page):
+        state = self._pages.pop(page, None)
+        if not state:
+            return {"blocked_requests": 0, "bytes_saved": 0}
+        return {
+            "blocked_requests": state["blocked_requests"],
+            "bytes_saved": state["bytes_saved"],
+        }
+
+    def _state_for(self, request):
+        try:
+            return self._pages.get(request.frame.page)
+        except Exception:
+            # request của service worker không có frame
+            return None
+
+    def _is_tracker(self, url):
+        host = urlparse(url).hostname or ""
+        return any(
+            host == h or host.endswith("." + h) for h in self.block_hosts
+        )
+
+    async def handle(self, route):
+        request = route.request
+        rtype = request.resource_type
+        state = self._state_for(request)
+
+        if self._is_tracker(request.url) or rtype in self.block_types:
+            size = EST_BYTES.get(rtype, EST_BYTES_OTHER)
+
+            self.total["blocked_requests"] += 1
+            self.total["bytes_saved"] += size
+            if state:
+                state["blocked_requests"] += 1
+                state["bytes_saved"] += size
+
+            await route.abort()
+            return
+
+        await route.fallback()
+
+
+_BLOCKERS = weakref.WeakKeyDictionary()
+
+
+def get_resource_blocker(context):
+    return _BLOCKERS.get(context)
+
+
+async def install_fetch_profile(context, fetch_profile):
+    profile = FETCH_PROFILES.get(fetch_profile)
+    if fetch_profile not in FETCH_PROFILES:
+        raise ValueError(f"❌ Unsupported fetch_profile: {fetch_profile}")
+
+    if not profile:
+        return None
+
+    # ⚠️ bật route thì Playwright tắt HTTP cache của context
+    blocker = ResourceBlocker(profile)
+    await context.route("**/*", blocker.handle)
+    _BLOCKERS[context] = blocker
+
+    logger.info(f"🧱 Fetch profile '{fetch_profile}' installed")
+    return blocker
+
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/120.0.0.0 Safari/537.36"
+)
+
+
+async def start_chromium(playwright, headless=True):
+    return await playwright.chromium.launch(
         headless=headless,
         args=[
             "--disable-blink-features=AutomationControlled",
@@ -13,22 +139,81 @@ async def create_browser(headless=True, session_file=None):
         ],
     )
 
-    # ===== TẠO CONTEXT =====
+
+async def launch_browser(headless=True):
+    playwright = await async_playwright().start()
+    browser = await start_chromium(playwright, headless)
+    return playwright, browser
+
+
+async def new_context(browser, session_file=None, fetch_profile="full",
+                      storage_state=None):
     context_kwargs = {
-        "user_agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0.0.0 Safari/537.36"
-        ),
+        "user_agent": USER_AGENT,
         "viewport": {"width": 1280, "height": 800},
     }
 
-    # 👉 nếu có session thì dùng, không có thì bỏ qua
-    if session_file and os.path.exists(session_file):
+    # 👉 state trong RAM (context cũ vừa recycle) > file session > không có
+    if storage_state:
+        context_kwargs["storage_state"] = storage_state
+    elif session_file and os.path.exists(session_file):
         context_kwargs["storage_state"] = session_file
 
     context = await browser.new_context(**context_kwargs)
 
-    page = await context.new_page()
+    await install_fetch_profile(context, fetch_profile)
+
+    return context
+
+
+# ===========================
+# MEMORY / HEALTH (CDP)
+# ===========================
+
+async def context_memory(context):
+    """
+    Bộ nhớ renderer của 1 context: tổng JS heap + số DOM node các page
+    (CDP Performance.getMetrics). Page đang đóng / crash thì bỏ qua.
+    """
+    usage = {"pages": 0, "js_heap_mb": 0.0, "nodes": 0}
+
+    for page in list(context.pages):
+        try:
+            cdp = await context.new_cdp_session(page)
+            await cdp.send("Performance.enable")
+            result = await cdp.send("Performance.getMetrics")
+            await cdp.detach()
+        except Exception:
+            continue
+
+        values = {m["name"]: m["value"] for m in result.get("metrics", [])}
+        usage["pages"] += 1
+        usage["js_heap_mb"] += values.get("JSHeapUsedSize", 0) / 1_000_000
+        usage["nodes"] += int(values.get("Nodes", 0))
+
+    usage["js_heap_mb"] = round(usage["js_heap_mb"], 1)
+    return usage
+
+
+async def browser_responsive(browser, timeout=10):
+    # ping process browser qua CDP – treo / mất kết nối → False
+    if not browser.is_connected():
+        return False
+
+    try:
+        cdp = await asyncio.wait_for(browser.new_browser_cdp_session(), timeout)
+        await asyncio.wait_for(cdp.send("Browser.getVersion"), timeout)
+        await cdp.detach()
+        return True
+    except Exception:
+        return False
+
+
+async def create_browser(headless=True, session_file=None, fetch_profile="full"):
+    playwright, browser = await launch_browser(headless=headless)
+
+    # ===== TẠO CONTEXT =====
+    # page do người gọi tự mở (hoặc mượn từ WarmPagePool) khi thật sự cần
+    context = await new_context(browser, session_file, fetch_profile)
 
-    return playwright, browser, context, page
+    return playwright, browser, context
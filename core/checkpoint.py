@@ -0,0 +1,93 @@
+import json
+import os
+import time
+from core.logger import setup_logger
+
+logger = setup_logger()
+
+CHECKPOINT_DIR = "checkpoints"
+
+
+class Checkpoint:
+    """
+    Trạng thái tiến độ của 1 task (list đã crawl, cursor, stage đã xong...).
+    Ghi xuống file tối đa mỗi `interval` giây; không có store → chỉ giữ trong RAM.
+    """
+
+    def __init__(self, store=None, task_id=None, state=None, interval=10):
+        self.store = store
+        self.task_id = task_id
+        self.state = state or {}
+        self.interval = interval
+        self._last_flush = time.monotonic()
+
+    @property
+    def resumed(self):
+        return bool(self.state)
+
+    def get(self, key, default=None):
+        return self.state.get(key, default)
+
+    def set(self, key, value, force=False):
+        self.state[key] = value
+
+        if force or time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def extend(self, key, items, force=False):
+        """
+        Nối item mới vào list `key` tại chỗ (không dựng lại cả list mỗi round);
+        cả list chỉ được serialize khi flush. Trả về list đang giữ.
+        """
+        values = self.state.setdefault(key, [])
+        values.extend(items)
+
+        if force or time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+        return values
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if self.store and self.task_id:
+            self.store.save(self.task_id, self.state)
+
+
+class CheckpointStore:
+    def __init__(self, directory=CHECKPOINT_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, task_id):
+        return os.path.join(self.directory, f"{task_id}.json")
+
+    def load(self, task_id):
+        path = self._path(task_id)
+        if not os.path.exists(path):
+            return {}
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Checkpoint {task_id} unreadable: {e}")
+            return {}
+
+    def save(self, task_id, state):
+        # ghi file tạm rồi replace → không bao giờ để lại file hỏng
+        path = self._path(task_id)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def clear(self, task_id):
+        try:
+            os.remove(self._path(task_id))
+        except FileNotFoundError:
+            pass
+
+    def open(self, task_id, interval=10):
+        state = self.load(task_id)
+        if state:
+            logger.info(f"♻️ Resume task {task_id} from checkpoint")
+        return Checkpoint(self, task_id, state, interval)
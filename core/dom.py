@@ -0,0 +1,142 @@
+from core import metrics
+
+# ===========================
+# BATCH SNAPSHOT (1 evaluate / round)
+# ===========================
+
+# đọc field theo spec {"name": {"selector", "attr": "text" | <attribute>}}
+_READ_FIELDS_JS = """
+    const readFields = (el, fields, item) => {
+        for (const [name, spec] of Object.entries(fields || {})) {
+            const node = spec.selector ? el.querySelector(spec.selector) : el;
+            if (!node) {
+                item[name] = null;
+            } else if (spec.attr === 'text') {
+                item[name] = node.innerText;
+            } else {
+                item[name] = node.getAttribute(spec.attr);
+            }
+        }
+        return item;
+    };
+"""
+
+_SNAPSHOT_JS = """
+({selector, seenKey, keyAttr, keyPattern, fields, requireText, maxItems}) => {
+""" + _READ_FIELDS_JS + """
+    window.__crawlSeen = window.__crawlSeen || {};
+    const seen = window.__crawlSeen[seenKey] =
+        window.__crawlSeen[seenKey] || new Set();
+
+    const re = new RegExp(keyPattern);
+    const out = [];
+
+    for (const el of document.querySelectorAll(selector)) {
+        if (out.length >= maxItems) break;
+
+        const raw = el.getAttribute(keyAttr);
+        const m = raw && raw.match(re);
+        if (!m) continue;
+
+        const key = m[1] || m[0];
+        if (seen.has(key)) continue;
+
+        if (requireText) {
+            const ok = [...el.querySelectorAll(requireText.selector)]
+                .some(n => (n.textContent || '').includes(requireText.text));
+            if (!ok) continue;
+        }
+
+        seen.add(key);
+        out.push(readFields(el, fields, {key, [keyAttr]: raw}));
+    }
+
+    return out;
+}
+"""
+
+
+async def snapshot_new_items(
+    page,
+    selector,
+    seen_key,
+    key_attr="href",
+    key_pattern=".+",
+    fields=None,
+    require_text=None,
+    max_items=1000,
+):
+    """
+    Lấy 1 lần toàn bộ item MỚI khớp selector (dedup ngay trong page).
+
+    - key: group 1 của key_pattern áp lên attribute key_attr
+    - fields: {"name": {"selector": "img", "attr": "src" | "text"}}
+    - require_text: {"selector": "p", "text": "Followers"} → lọc card
+    """
+    with metrics.stage("extract"):
+        return await page.evaluate(_SNAPSHOT_JS, {
+            "selector": selector,
+            "seenKey": seen_key,
+            "keyAttr": key_attr,
+            "keyPattern": key_pattern,
+            "fields": fields or {},
+            "requireText": require_text,
+            "maxItems": max_items,
+        })
+
+
+# ===========================
+# TAKE + PRUNE (list rất dài: comment, follower)
+# ===========================
+
+# node đã lấy được đánh dấu bằng attribute này
+TAKEN_ATTR = "data-crawled"
+
+_TAKE_JS = """
+({selector, mark, fields, keep}) => {
+""" + _READ_FIELDS_JS + """
+    const out = [];
+    for (const el of document.querySelectorAll(`${selector}:not([${mark}])`)) {
+        el.setAttribute(mark, '1');
+        out.push(readFields(el, fields, {}));
+    }
+
+    // chỉ giữ `keep` node đã lấy gần nhất → DOM + querySelectorAll không phình
+    let pruned = 0;
+    if (keep > 0) {
+        const taken = document.querySelectorAll(`${selector}[${mark}]`);
+        for (let i = 0; i < taken.length - keep; i++) {
+            taken[i].remove();
+            pruned++;
+        }
+    }
+
+    return {items: out, pruned};
+}
+"""
+
+
+def untaken(selector):
+    """Selector node chưa lấy – tín hiệu tăng trưởng cho ScrollEngine khi prune"""
+    return f"{selector}:not([{TAKEN_ATTR}])"
+
+
+async def take_new_items(page, selector, fields, keep=0):
+    """
+    Lấy field của các node CHƯA lấy khớp selector rồi đánh dấu chúng
+    (1 evaluate / round, chỉ đụng node mới → chi phí không tăng theo độ sâu).
+
+    - keep > 0: xoá node đã lấy cũ, chỉ giữ `keep` node cuối trong DOM
+    - keep = 0: giữ nguyên DOM
+    """
+    with metrics.stage("extract"):
+        result = await page.evaluate(_TAKE_JS, {
+            "selector": selector,
+            "mark": TAKEN_ATTR,
+            "fields": fields,
+            "keep": keep or 0,
+        })
+
+    if result["pruned"]:
+        metrics.incr("dom_pruned", result["pruned"])
+    return result["items"]
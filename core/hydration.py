@@ -0,0 +1,236 @@
+from core import metrics
+from core.logger import setup_logger
+from core.utils import parse_number, ts_to_iso
+
+logger = setup_logger()
+
+REHYDRATION_SELECTOR = "script#__UNIVERSAL_DATA_FOR_REHYDRATION__"
+
+
+# ===========================
+# REHYDRATION SCRIPT
+# ===========================
+
+async def wait_for_rehydration(page, timeout=10000):
+    try:
+        await page.wait_for_selector(
+            REHYDRATION_SELECTOR,
+            state="attached",
+            timeout=timeout
+        )
+        return True
+    except Exception:
+        return False
+
+
+# ===========================
+# PROFILE
+# ===========================
+
+# parse JSON ngay trong page, chỉ trả về các field cần → 1 evaluate / profile
+_PROFILE_JS = """
+() => {
+    const el = document.querySelector(
+        'script#__UNIVERSAL_DATA_FOR_REHYDRATION__'
+    );
+    if (!el) return null;
+
+    let data;
+    try { data = JSON.parse(el.textContent); } catch (e) { return null; }
+
+    const scope = data.__DEFAULT_SCOPE__ || {};
+    const info = (scope['webapp.user-detail'] || {}).userInfo;
+    if (!info || !info.user || !info.user.uniqueId) return null;
+
+    const u = info.user;
+    const s = info.stats || {};
+    return {
+        id: u.id,
+        uniqueId: u.uniqueId,
+        nickname: u.nickname,
+        signature: u.signature,
+        avatarLarger: u.avatarLarger,
+        verified: u.verified,
+        bioLink: (u.bioLink || {}).link || null,
+        followerCount: s.followerCount,
+        followingCount: s.followingCount,
+        videoCount: s.videoCount,
+        heartCount: s.heartCount,
+    };
+}
+"""
+
+
+def _profile_from_hydration(data, profile_url):
+    return {
+        "tiktok_id": str(data.get("id") or data["uniqueId"]),
+        "username": data["uniqueId"],
+        "display_name": data.get("nickname"),
+        "bio": data.get("signature"),
+        "avatar_url": data.get("avatarLarger"),
+        "profile_url": profile_url,
+        "verified": data.get("verified"),
+
+        "follower_count": data.get("followerCount"),
+        "following_count": data.get("followingCount"),
+        "video_count": data.get("videoCount"),
+        "like_count": data.get("heartCount"),
+
+        "external_link": data.get("bioLink"),
+    }
+
+
+async def _profile_from_dom(page, username, profile_url):
+    await page.wait_for_selector("h1[data-e2e='user-title']", timeout=20000)
+
+    async def text_of(selector):
+        el = page.locator(selector)
+        if await el.count() > 0:
+            return await el.first.inner_text()
+        return None
+
+    avatar = None
+    avatar_el = page.locator("img[src*='tiktokcdn']")
+    if await avatar_el.count() > 0:
+        avatar = await avatar_el.first.get_attribute("src")
+
+    external_link = None
+    link_el = page.locator("a[data-e2e='user-link']")
+    if await link_el.count() > 0:
+        external_link = await link_el.first.get_attribute("href")
+
+    return {
+        "tiktok_id": username,
+        "username": username,
+        "display_name": await text_of("h2[data-e2e='user-subtitle']"),
+        "bio": await text_of("h2[data-e2e='user-bio']"),
+        "avatar_url": avatar,
+        "profile_url": profile_url,
+        "verified": None,
+
+        "follower_count": parse_number(
+            await text_of("strong[data-e2e='followers-count']")
+        ),
+        "following_count": parse_number(
+            await text_of("strong[data-e2e='following-count']")
+        ),
+        "video_count": None,
+        "like_count": parse_number(
+            await text_of("strong[data-e2e='likes-count']")
+        ),
+
+        "external_link": external_link,
+    }
+
+
+async def extract_profile(page, username, timeout=10000, rate_limiter=None,
+                          profile_cache=None, fields=None):
+    """
+    Mở profile và lấy data từ __UNIVERSAL_DATA_FOR_REHYDRATION__ (số chính xác).
+    Chỉ fallback sang DOM khi không có blob hydration.
+    Có profile_cache và `fields` còn hạn → trả từ cache, không mở trang.
+    """
+    if profile_cache:
+        cached = profile_cache.get(username, fields=fields)
+        if cached:
+            return cached
+
+    profile_url = f"https://www.tiktok.com/@{username}"
+
+    if rate_limiter:
+        await rate_limiter.acquire("profile")
+
+    response = await page.goto(
+        profile_url, timeout=60000, wait_until="domcontentloaded"
+    )
+
+    if rate_limiter:
+        await rate_limiter.report_page("profile", page, response)
+
+    if await wait_for_rehydration(page, timeout):
+        with metrics.stage("extract"):
+            data = await page.evaluate(_PROFILE_JS)
+        if data:
+            profile = _profile_from_hydration(data, profile_url)
+            # chỉ cache số liệu chính xác từ hydration, không cache bản DOM
+            if profile_cache:
+                profile_cache.put(profile)
+            return profile
+
+    logger.warning(f"⚠️ No hydration data @{username} → fallback DOM")
+    return await _profile_from_dom(page, username, profile_url)
+
+
+# ===========================
+# VIDEO
+# ===========================
+
+_VIDEO_JS = """
+() => {
+    const el = document.querySelector(
+        'script#__UNIVERSAL_DATA_FOR_REHYDRATION__'
+    );
+    if (!el) return null;
+
+    let data;
+    try { data = JSON.parse(el.textContent); } catch (e) { return null; }
+
+    const scope = data.__DEFAULT_SCOPE__ || {};
+    const item = ((scope['webapp.video-detail'] || {}).itemInfo || {}).itemStruct;
+    if (!item || !item.id) return null;
+
+    // statsV2 là string → không bị tràn / làm tròn với số lớn
+    const s = Object.assign({}, item.stats || {}, item.statsV2 || {});
+    const num = (v) => (v === undefined || v === null || v === '')
+        ? null : Number(v);
+    const author = item.author || {};
+
+    return {
+        id: item.id,
+        desc: item.desc,
+        createTime: item.createTime,
+        authorId: author.id,
+        authorUniqueId: author.uniqueId,
+        authorNickname: author.nickname,
+        playCount: num(s.playCount),
+        diggCount: num(s.diggCount),
+        commentCount: num(s.commentCount),
+        shareCount: num(s.shareCount),
+        collectCount: num(s.collectCount),
+    };
+}
+"""
+
+
+async def read_video_item(page, timeout=10000):
+    """
+    Đọc itemStruct của trang video đang mở (không goto).
+    Trả về None nếu không có blob hydration.
+    """
+    if not await wait_for_rehydration(page, timeout):
+        return None
+
+    with metrics.stage("extract"):
+        data = await page.evaluate(_VIDEO_JS)
+    if not data:
+        return None
+
+    author = data.get("authorUniqueId")
+
+    return {
+        "video_id": str(data["id"]),
+        "caption": data.get("desc"),
+
+        "author_id": str(data["authorId"]) if data.get("authorId") else None,
+        "author_username": author,
+        "author_display_name": data.get("authorNickname"),
+        "author_profile": f"https://www.tiktok.com/@{author}" if author else None,
+
+        "view_count": data.get("playCount"),
+        "like_count": data.get("diggCount"),
+        "comment_count": data.get("commentCount"),
+        "share_count": data.get("shareCount"),
+        "collect_count": data.get("collectCount"),
+
+        "create_time": ts_to_iso(data.get("createTime")),
+    }
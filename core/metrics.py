@@ -0,0 +1,299 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import time
+import weakref
+from collections import defaultdict
+from contextlib import contextmanager
+from core.logger import setup_logger
+
+logger = setup_logger()
+
+# metrics của task đang chạy – asyncio task con (gather, page pool) kế thừa
+_current = contextvars.ContextVar("task_metrics", default=None)
+
+
+# ===========================
+# PER-TASK
+# ===========================
+
+class TaskMetrics:
+    """
+    Thời gian theo stage + bộ đếm của 1 task.
+    Stage có thể lồng nhau (vd: pacing nằm trong scroll) → tổng stage > wall.
+    """
+
+    def __init__(self, task_id=None, scan_type=None):
+        self.task_id = task_id
+        self.scan_type = scan_type
+        self.started = time.perf_counter()
+        self.stages = defaultdict(lambda: {"seconds": 0.0, "count": 0})
+        self.counters = defaultdict(int)
+        self.pages = {}   # id(page) -> {"requests", "bytes"}
+
+    def observe(self, stage, seconds):
+        entry = self.stages[stage]
+        entry["seconds"] += seconds
+        entry["count"] += 1
+        REGISTRY.observe(self.scan_type, stage, seconds)
+
+    def incr(self, name, value=1):
+        self.counters[name] += value
+        REGISTRY.incr(self.scan_type, name, value)
+
+    def summary(self):
+        wall = time.perf_counter() - self.started
+        items = self.counters.get("items", 0)
+        calls = self.counters.get("playwright_calls", 0)
+        return {
+            "wall_s": round(wall, 3),
+            "stages": {
+                name: {
+                    "seconds": round(entry["seconds"], 3),
+                    "count": entry["count"],
+                }
+                for name, entry in sorted(self.stages.items())
+            },
+            "counters": dict(self.counters),
+            "items_per_s": round(items / wall, 3) if wall else 0.0,
+            "calls_per_item": round(calls / items, 2) if items else None,
+            "pages": list(self.pages.values()),
+        }
+
+
+def current():
+    return _current.get()
+
+
+def count_items(result):
+    # list → số phần tử; dict → tổng các mảng bên trong (followers, following...)
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        return sum(len(v) for v in result.values() if isinstance(v, list))
+    return 0
+
+
+@contextmanager
+def track_task(task_id=None, scan_type=None):
+    metrics = TaskMetrics(task_id, scan_type)
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """Cộng thời gian khối lệnh vào stage `name` của task hiện tại"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = _current.get()
+        if metrics:
+            metrics.observe(name, time.perf_counter() - started)
+
+
+def observe(name, seconds):
+    metrics = _current.get()
+    if metrics:
+        metrics.observe(name, seconds)
+
+
+def incr(name, value=1):
+    metrics = _current.get()
+    if metrics:
+        metrics.incr(name, value)
+
+
+# page → metrics của task đang mượn page (page được tái sử dụng giữa các task)
+_PAGE_OWNERS = weakref.WeakKeyDictionary()
+_WATCHED = weakref.WeakSet()
+
+
+def watch_page(page):
+    """Đếm request + byte (theo content-length) của 1 page cho task hiện tại"""
+    metrics = _current.get()
+    if not metrics:
+        _PAGE_OWNERS.pop(page, None)
+        return
+
+    _PAGE_OWNERS[page] = (metrics, metrics.pages.setdefault(
+        id(page), {"page": len(metrics.pages) + 1, "requests": 0, "bytes": 0}
+    ))
+    if page in _WATCHED:
+        return
+    _WATCHED.add(page)
+
+    def on_response(response):
+        owner = _PAGE_OWNERS.get(page)
+        if not owner:
+            return
+
+        metrics, stats = owner
+        size = int(response.headers.get("content-length") or 0)
+        stats["requests"] += 1
+        stats["bytes"] += size
+        metrics.incr("page_requests")
+        metrics.incr("page_bytes", size)
+
+    # chỉ gắn 1 listener / page, đổi chủ theo task đang mượn
+    page.on("response", on_response)
+
+
+def unwatch_page(page):
+    _PAGE_OWNERS.pop(page, None)
+
+
+# ===========================
+# PLAYWRIGHT CALLS
+# ===========================
+
+_INSTRUMENTED = False
+
+
+def instrument_playwright():
+    """
+    Bọc method async public của Page / Locator / ElementHandle / Mouse:
+    đếm playwright_calls, goto tính vào stage "navigate". Gọi 1 lần / process.
+    """
+    global _INSTRUMENTED
+    if _INSTRUMENTED:
+        return
+    _INSTRUMENTED = True
+
+    from playwright.async_api import ElementHandle, Locator, Mouse, Page
+
+    def counted(fn, stage_name=None):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            incr("playwright_calls")
+            if not stage_name:
+                return await fn(*args, **kwargs)
+            with stage(stage_name):
+                return await fn(*args, **kwargs)
+        return wrapper
+
+    for cls in (Page, Locator, ElementHandle, Mouse):
+        for name, fn in list(vars(cls).items()):
+            if name.startswith("_") or not inspect.iscoroutinefunction(fn):
+                continue
+            stage_name = "navigate" if name in ("goto", "reload") else None
+            setattr(cls, name, counted(fn, stage_name))
+
+
+# ===========================
+# PROCESS-WIDE (PROMETHEUS)
+# ===========================
+
+class Registry:
+    def __init__(self):
+        self.stage_seconds = defaultdict(float)   # (scan_type, stage)
+        self.stage_count = defaultdict(int)
+        self.counters = defaultdict(int)          # (scan_type, name)
+        self.tasks = defaultdict(int)             # (scan_type, status)
+        self.backend = defaultdict(                # (method, status)
+            lambda: {"seconds": 0.0, "count": 0}
+        )
+        self.gauges = {}                          # (name, session) -> value
+
+    def observe(self, scan_type, stage_name, seconds):
+        key = (scan_type or "none", stage_name)
+        self.stage_seconds[key] += seconds
+        self.stage_count[key] += 1
+
+    def incr(self, scan_type, name, value=1):
+        self.counters[(scan_type or "none", name)] += value
+
+    def task_done(self, scan_type, status):
+        self.tasks[(scan_type or "none", status)] += 1
+
+    def set_gauge(self, name, session, value):
+        self.gauges[(name, session)] = value
+
+    def backend_call(self, method, status, seconds):
+        entry = self.backend[(method, str(status))]
+        entry["seconds"] += seconds
+        entry["count"] += 1
+
+    def render(self):
+        lines = [
+            "# TYPE crawler_stage_seconds_total counter",
+            *(
+                f'crawler_stage_seconds_total{{scan_type="{s}",stage="{n}"}} {v:.6f}'
+                for (s, n), v in sorted(self.stage_seconds.items())
+            ),
+            "# TYPE crawler_stage_calls_total counter",
+            *(
+                f'crawler_stage_calls_total{{scan_type="{s}",stage="{n}"}} {v}'
+                for (s, n), v in sorted(self.stage_count.items())
+            ),
+            "# TYPE crawler_events_total counter",
+            *(
+                f'crawler_events_total{{scan_type="{s}",name="{n}"}} {v}'
+                for (s, n), v in sorted(self.counters.items())
+            ),
+            "# TYPE crawler_tasks_total counter",
+            *(
+                f'crawler_tasks_total{{scan_type="{s}",status="{st}"}} {v}'
+                for (s, st), v in sorted(self.tasks.items())
+            ),
+            "# TYPE backend_request_seconds_total counter",
+            *(
+                f'backend_request_seconds_total{{method="{m}",status="{st}"}} '
+                f'{e["seconds"]:.6f}'
+                for (m, st), e in sorted(self.backend.items())
+            ),
+            "# TYPE backend_requests_total counter",
+            *(
+                f'backend_requests_total{{method="{m}",status="{st}"}} {e["count"]}'
+                for (m, st), e in sorted(self.backend.items())
+            ),
+        ]
+        for name in sorted({n for n, _ in self.gauges}):
+            lines.append(f"# TYPE crawler_session_{name} gauge")
+            lines.extend(
+                f'crawler_session_{name}{{session="{s}"}} {v}'
+                for (n, s), v in sorted(self.gauges.items()) if n == name
+            )
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+async def _handle_scrape(reader, writer):
+    try:
+        request_line = await reader.readline()
+        # bỏ phần header còn lại của request
+        while (await reader.readline()).strip():
+            pass
+
+        path = request_line.decode("latin-1").split(" ")[1:2]
+        if path and path[0].startswith("/metrics"):
+            status, body = "200 OK", REGISTRY.render()
+        else:
+            status, body = "404 Not Found", "not found\n"
+
+        data = body.encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1") + data
+        )
+        await writer.drain()
+    except Exception:
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(port, host="127.0.0.1"):
+    """GET /metrics → text format Prometheus"""
+    server = await asyncio.start_server(_handle_scrape, host, port)
+    logger.info(f"📈 Metrics: http://{host}:{port}/metrics")
+    return server
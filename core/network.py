@@ -0,0 +1,89 @@
+import asyncio
+
+
+class ResponseCollector:
+    """
+    Nghe response JSON mà page TikTok tự gọi (comment list, follower list...)
+    Payload được đẩy vào queue để crawler đọc, không cần chạm vào DOM.
+    """
+
+    def __init__(self, page, url_part, rate_limiter=None, endpoint=None):
+        self.page = page
+        self.url_part = url_part
+        self.rate_limiter = rate_limiter
+        self.endpoint = endpoint
+        self.queue = asyncio.Queue()
+        self.responses = 0
+        self._arrived = asyncio.Event()
+        self._pending = set()
+
+    def start(self):
+        self.page.on("response", self._on_response)
+        return self
+
+    def stop(self):
+        try:
+            self.page.remove_listener("response", self._on_response)
+        except Exception:
+            pass
+
+        for job in self._pending:
+            job.cancel()
+        self._pending.clear()
+
+    def _on_response(self, response):
+        if self.url_part not in response.url:
+            return
+
+        if response.status == 429:
+            if self.rate_limiter:
+                self.rate_limiter.report(self.endpoint, "throttled")
+            return
+
+        job = asyncio.ensure_future(self._read(response))
+        self._pending.add(job)
+        job.add_done_callback(self._pending.discard)
+
+    async def _read(self, response):
+        try:
+            data = await response.json()
+        except Exception:
+            return
+
+        self.responses += 1
+        await self.queue.put(data)
+        self._arrived.set()
+
+    async def next(self, timeout=10):
+        """Đợi payload tiếp theo, hết timeout → None"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def wait_new(self, since, timeout=10):
+        """
+        Đợi tới khi có response thứ `since + 1` (không lấy khỏi queue).
+        Dùng làm tín hiệu "đã load thêm" cho scroll.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        while self.responses <= since:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return self.responses > since
+
+        return True
+
+    def drain(self):
+        items = []
+        while not self.queue.empty():
+            items.append(self.queue.get_nowait())
+        return items
@@ -0,0 +1,221 @@
+import asyncio
+import weakref
+from core import metrics
+from core.browser import get_resource_blocker
+from core.logger import setup_logger
+
+logger = setup_logger()
+
+WARM_URL = "https://www.tiktok.com/"
+MAX_PAGE_USES = 20           # task / page trước khi thay page mới
+MAX_PAGE_HEAP_MB = 300       # JS heap vượt ngưỡng → thay page mới
+
+_HEAP_JS = """
+() => performance.memory ? performance.memory.usedJSHeapSize : 0
+"""
+
+
+# ===========================
+# WARM PAGE POOL
+# ===========================
+
+class WarmPagePool:
+    """
+    Page mở sẵn + đã vào TikTok 1 lần (renderer, kết nối đã nóng) cho 1 context.
+    Task mượn page rồi trả; page trả về được đưa lại warm_url (reset state
+    của trang) hoặc thay bằng page mới khi dùng quá max_uses lần,
+    JS heap vượt max_heap_mb hoặc task lỗi.
+    """
+
+    def __init__(self, context, size=2, warm_url=WARM_URL,
+                 max_uses=MAX_PAGE_USES, max_heap_mb=MAX_PAGE_HEAP_MB,
+                 rate_limiter=None):
+        self.context = context
+        self.size = size
+        self.warm_url = warm_url
+        self.max_uses = max_uses
+        self.max_heap_mb = max_heap_mb
+        self.rate_limiter = rate_limiter
+
+        self._idle = asyncio.Queue()
+        self._uses = weakref.WeakKeyDictionary()
+        self._jobs = set()
+        self._closed = False
+
+    async def start(self):
+        for _ in range(self.size):
+            self._idle.put_nowait(await self._new_page(warm=True))
+        _POOLS[self.context] = self
+        return self
+
+    async def _new_page(self, warm):
+        page = await self.context.new_page()
+        self._uses[page] = 0
+        if warm:
+            await self._warm(page)
+        return page
+
+    async def _warm(self, page):
+        try:
+            if self.rate_limiter:
+                await self.rate_limiter.acquire("profile")
+            await page.goto(
+                self.warm_url, wait_until="domcontentloaded", timeout=30000
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Warm page failed: {e}")
+
+    async def _heap_mb(self, page):
+        try:
+            return (await page.evaluate(_HEAP_JS)) / 1_000_000
+        except Exception:
+            return 0
+
+    async def acquire(self):
+        # có page nóng → dùng ngay; hết → mở page mới, không bắt task đợi
+        while not self._idle.empty():
+            page = self._idle.get_nowait()
+            if not page.is_closed():
+                return page
+        return await self._new_page(warm=False)
+
+    async def release(self, page, reusable=True):
+        if page.is_closed():
+            return
+
+        self._uses[page] = self._uses.get(page, 0) + 1
+
+        # reset / thay page chạy nền → task trả page không phải đợi
+        job = asyncio.ensure_future(self._recycle(page, reusable))
+        self._jobs.add(job)
+        job.add_done_callback(self._jobs.discard)
+
+    async def _recycle(self, page, reusable):
+        keep = (
+            reusable
+            and not self._closed
+            and self._idle.qsize() < self.size
+            and self._uses.get(page, 0) < self.max_uses
+            and await self._heap_mb(page) < self.max_heap_mb
+        )
+
+        if keep:
+            await self._warm(page)
+            if not page.is_closed() and not self._closed:
+                self._idle.put_nowait(page)
+                return
+
+        await _close_quietly(page)
+
+        if not self._closed and self._idle.qsize() < self.size:
+            try:
+                self._idle.put_nowait(await self._new_page(warm=True))
+            except Exception as e:
+                logger.warning(f"⚠️ Replace warm page failed: {e}")
+
+    async def close(self):
+        self._closed = True
+        _POOLS.pop(self.context, None)
+
+        for job in list(self._jobs):
+            job.cancel()
+        await asyncio.gather(*self._jobs, return_exceptions=True)
+
+        while not self._idle.empty():
+            await _close_quietly(self._idle.get_nowait())
+
+
+_POOLS = weakref.WeakKeyDictionary()
+
+
+def get_page_pool(context):
+    return _POOLS.get(context)
+
+
+async def _close_quietly(page):
+    try:
+        await page.close()
+    except Exception:
+        pass
+
+
+# ===========================
+# MƯỢN / TRẢ PAGE
+# ===========================
+
+async def open_page(context):
+    # context có warm pool → mượn page nóng, không thì mở page mới
+    pool = get_page_pool(context)
+    page = await pool.acquire() if pool else await context.new_page()
+
+    blocker = get_resource_blocker(context)
+    if blocker:
+        blocker.bind_page(page)
+    metrics.watch_page(page)
+    return page
+
+
+async def close_page(context, page, reusable=True):
+    blocker = get_resource_blocker(context)
+    if blocker:
+        blocker.release_page(page)
+    metrics.unwatch_page(page)
+
+    pool = get_page_pool(context)
+    if pool:
+        await pool.release(page, reusable=reusable)
+    else:
+        await _close_quietly(page)
+
+
+async def run_on_pages(page, items, worker, concurrency=3, on_result=None,
+                       until=None):
+    """
+    Chạy worker(page, item) cho từng item trên tối đa `concurrency` page
+    cùng context (page của task + page phụ mở thêm).
+
+    - Kết quả trả về đúng thứ tự items; item lỗi → None (không kéo theo item khác)
+    - on_result(index, result) gọi ngay khi 1 item xong (thứ tự hoàn thành)
+    - until(item) → True trước khi lấy item: lane dừng, item còn lại giữ None
+      (items đã xếp sao cho item sau cũng thoả)
+    - Nhịp request do rate limiter trong worker quyết định, pool chỉ giới hạn page
+    """
+    items = list(items)
+    results = [None] * len(items)
+    if not items:
+        return results
+
+    context = page.context
+    queue = asyncio.Queue()
+    for index, item in enumerate(items):
+        queue.put_nowait((index, item))
+
+    async def _lane(lane_page, owned):
+        try:
+            while not queue.empty():
+                index, item = queue.get_nowait()
+                if until and until(item):
+                    break
+
+                try:
+                    # page phụ mở lúc cần; page crash / đóng ở item trước → mở mới
+                    if lane_page is None or lane_page.is_closed():
+                        lane_page = await open_page(context)
+                        owned = True
+
+                    results[index] = await worker(lane_page, item)
+                except Exception as e:
+                    logger.warning(f"❌ Item {index} failed | {e}")
+                    continue
+
+                if on_result:
+                    await on_result(index, results[index])
+        finally:
+            if owned and lane_page is not None:
+                await close_page(context, lane_page)
+
+    lanes = [_lane(page, False)] + [
+        _lane(None, True) for _ in range(min(concurrency, len(items)) - 1)
+    ]
+    await asyncio.gather(*lanes)
+    return results
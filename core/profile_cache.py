@@ -0,0 +1,222 @@
+import json
+import os
+import sqlite3
+import time
+from core import metrics
+from core.logger import setup_logger
+
+logger = setup_logger()
+
+CACHE_PATH = os.path.join("cache", "profiles.sqlite3")
+MAX_PROFILES = 50_000
+
+# TTL theo field (giây): số liệu đổi nhanh, thông tin định danh đổi chậm
+# field có trong FIELD_TTL = nhóm số liệu (mốc stats_at, làm mới được từ
+# list API); field còn lại = định danh (mốc saved_at, TTL DEFAULT_TTL)
+FIELD_TTL = {
+    "follower_count": 6 * 60 * 60,
+    "following_count": 6 * 60 * 60,
+    "video_count": 6 * 60 * 60,
+    "like_count": 6 * 60 * 60,
+}
+DEFAULT_TTL = 7 * 24 * 60 * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    username  TEXT PRIMARY KEY,
+    tiktok_id TEXT,
+    data      TEXT NOT NULL,
+    saved_at  REAL NOT NULL,
+    used_at   REAL NOT NULL,
+    stats_at  REAL
+);
+CREATE INDEX IF NOT EXISTS profiles_tiktok_id ON profiles (tiktok_id);
+CREATE INDEX IF NOT EXISTS profiles_used_at ON profiles (used_at);
+"""
+
+
+class ProfileCache:
+    """
+    Cache profile (SQLite) dùng chung giữa các task / lần chạy worker.
+    Tra theo username hoặc tiktok_id; đầy → bỏ entry lâu không dùng nhất (LRU).
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_PROFILES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._puts = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+        # cache tạo trước khi có stats_at → thêm cột (NULL = dùng saved_at)
+        columns = {r[1] for r in self._db.execute("PRAGMA table_info(profiles)")}
+        if "stats_at" not in columns:
+            self._db.execute("ALTER TABLE profiles ADD COLUMN stats_at REAL")
+            self._db.commit()
+
+    @staticmethod
+    def _fresh(fields, saved_at, stats_at, now):
+        # mỗi field so với mốc của nhóm mình → định danh 7 ngày vẫn dùng được
+        # dù số liệu đã cũ (khi caller không cần số liệu)
+        if not fields:
+            fields = (*FIELD_TTL, None)
+        for field in fields:
+            if field in FIELD_TTL:
+                if now - (stats_at or saved_at) > FIELD_TTL[field]:
+                    return False
+            elif now - saved_at > DEFAULT_TTL:
+                return False
+        return True
+
+    def _miss(self, stale=False):
+        self.misses += 1
+        metrics.incr("profile_cache_misses")
+        if stale:
+            self.stale += 1
+            metrics.incr("profile_cache_stale")
+        return None
+
+    def get(self, username=None, tiktok_id=None, fields=None):
+        """
+        Trả profile nếu mọi field trong `fields` còn hạn theo TTL của field
+        (None = tất cả field).
+        """
+        if username:
+            row = self._db.execute(
+                "SELECT username, data, saved_at, stats_at FROM profiles "
+                "WHERE username = ?",
+                (username,),
+            ).fetchone()
+        elif tiktok_id:
+            row = self._db.execute(
+                "SELECT username, data, saved_at, stats_at FROM profiles "
+                "WHERE tiktok_id = ?",
+                (str(tiktok_id),),
+            ).fetchone()
+        else:
+            row = None
+
+        if not row:
+            return self._miss()
+
+        key, data, saved_at, stats_at = row
+        now = time.time()
+        if not self._fresh(fields, saved_at, stats_at, now):
+            return self._miss(stale=True)
+
+        self._db.execute(
+            "UPDATE profiles SET used_at = ? WHERE username = ?", (now, key)
+        )
+        self._db.commit()
+        self.hits += 1
+        metrics.incr("profile_cache_hits")
+        return json.loads(data)
+
+    def refresh_stats(self, stats_by_username):
+        """
+        Làm mới số liệu (follower_count...) cho profile ĐÃ có trong cache,
+        lấy từ list API (follower / following) – không cần mở trang profile.
+        """
+        now = time.time()
+        refreshed = 0
+
+        for username, stats in stats_by_username.items():
+            row = self._db.execute(
+                "SELECT data FROM profiles WHERE username = ?", (username,)
+            ).fetchone()
+            if not row:
+                continue
+
+            profile = json.loads(row[0])
+            profile.update(
+                (k, v) for k, v in stats.items()
+                if k in FIELD_TTL and v is not None
+            )
+            self._db.execute(
+                "UPDATE profiles SET data = ?, stats_at = ? WHERE username = ?",
+                (json.dumps(profile, ensure_ascii=False), now, username),
+            )
+            refreshed += 1
+
+        if refreshed:
+            self._db.commit()
+            metrics.incr("profile_cache_stats_refreshed", refreshed)
+        return refreshed
+
+    def put(self, profile):
+        username = profile.get("username")
+        if not username:
+            return
+
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO profiles "
+            "(username, tiktok_id, data, saved_at, used_at, stats_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                username,
+                str(profile.get("tiktok_id") or ""),
+                json.dumps(profile, ensure_ascii=False),
+                now,
+                now,
+                now,
+            ),
+        )
+        self._db.commit()
+
+        # kiểm tra kích thước theo lô cho rẻ
+        self._puts += 1
+        if self._puts % 100 == 0:
+            self.evict()
+
+    def evict(self):
+        (count,) = self._db.execute("SELECT COUNT(*) FROM profiles").fetchone()
+        overflow = count - self.max_entries
+        if overflow <= 0:
+            return 0
+
+        self._db.execute(
+            "DELETE FROM profiles WHERE username IN ("
+            "SELECT username FROM profiles ORDER BY used_at LIMIT ?)",
+            (overflow,),
+        )
+        self._db.commit()
+        return overflow
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+    def close(self):
+        self.evict()
+        self._db.close()
+
+
+_CACHE = None
+
+
+def get_profile_cache():
+    # dùng chung giữa mọi task của worker
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = ProfileCache()
+    return _CACHE
+
+
+def close_profile_cache():
+    global _CACHE
+    if _CACHE is not None:
+        logger.info(f"🗃 Profile cache {_CACHE.stats()}")
+        _CACHE.close()
+        _CACHE = None
@@ -0,0 +1,139 @@
+import asyncio
+import random
+import time
+from core import metrics
+from core.logger import setup_logger
+
+logger = setup_logger()
+
+
+# ===========================
+# CONFIG
+# ===========================
+
+# request / giây theo loại endpoint: (ban đầu, tối thiểu, tối đa)
+ENDPOINT_RATES = {
+    "search": (0.3, 0.02, 1.0),
+    "profile": (0.5, 0.03, 2.0),
+    "video": (0.5, 0.03, 2.0),
+    "list": (1.0, 0.05, 3.0),
+}
+
+ADDITIVE_STEP = 0.05         # tăng rate sau mỗi response khoẻ
+BACKOFF_FACTOR = 0.5         # nhân rate khi bị throttle
+JITTER = 0.2                 # ±20% khoảng cách giữa 2 request
+PENALTY = {                  # nghỉ thêm (giây) ngay sau tín hiệu xấu
+    "throttled": 30,
+    "challenge": 120,
+    "empty": 5,
+}
+
+CAPTCHA_SELECTOR = (
+    "#captcha-verify-container, #tiktok-verify-ele, "
+    "div[class*='captcha_verify'], div[class*='CaptchaVerify']"
+)
+
+
+# ===========================
+# TOKEN BUCKET + AIMD
+# ===========================
+
+class AdaptiveLimiter:
+    def __init__(self, name, rate, min_rate, max_rate):
+        self.name = name
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+
+        self._next_at = 0.0          # thời điểm sớm nhất cho request kế
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # chia khoảng cách đều theo rate (burst = 1) + jitter
+        async with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_at, self._paused_until)
+
+            interval = 1 / self.rate
+            self._next_at = start + interval * random.uniform(
+                1 - JITTER, 1 + JITTER
+            )
+
+        wait = start - now
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def report(self, outcome):
+        if outcome == "ok":
+            self.rate = min(self.max_rate, self.rate + ADDITIVE_STEP)
+            return
+
+        old = self.rate
+        self.rate = max(self.min_rate, self.rate * BACKOFF_FACTOR)
+        self._paused_until = max(
+            self._paused_until, time.monotonic() + PENALTY.get(outcome, 0)
+        )
+        logger.warning(
+            f"🐢 {self.name} {outcome} → rate {old:.2f} → {self.rate:.2f} req/s"
+        )
+
+
+class SessionLimiter:
+    """Limiter của 1 session (tài khoản), mỗi loại endpoint 1 bucket"""
+
+    def __init__(self, session):
+        self.session = session
+        self.buckets = {
+            endpoint: AdaptiveLimiter(f"{session}/{endpoint}", *rates)
+            for endpoint, rates in ENDPOINT_RATES.items()
+        }
+        self.listeners = []   # callback(outcome) – vd: session pool đếm challenge
+
+    async def acquire(self, endpoint):
+        wait = await self.buckets[endpoint].acquire()
+        metrics.observe("pacing", wait)
+        return wait
+
+    def report(self, endpoint, outcome):
+        self.buckets[endpoint].report(outcome)
+        if outcome != "ok":
+            for listener in self.listeners:
+                listener(outcome)
+
+    async def report_page(self, endpoint, page, response=None):
+        outcome = await classify_page(page, response)
+        self.report(endpoint, outcome)
+        return outcome
+
+
+_SESSIONS = {}
+
+
+def get_rate_limiter(session="default"):
+    # dùng chung giữa mọi task chạy trên cùng session
+    if session not in _SESSIONS:
+        _SESSIONS[session] = SessionLimiter(session)
+    return _SESSIONS[session]
+
+
+# ===========================
+# PHÂN LOẠI RESPONSE
+# ===========================
+
+async def classify_page(page, response=None):
+    """ok | throttled (429) | challenge (captcha / verify)"""
+    if response is not None and response.status == 429:
+        return "throttled"
+
+    if "captcha" in page.url or "/verify" in page.url:
+        return "challenge"
+
+    try:
+        if await page.query_selector(CAPTCHA_SELECTOR):
+            return "challenge"
+    except Exception:
+        pass
+
+    return "ok"
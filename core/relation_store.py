@@ -0,0 +1,230 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+import uuid
+from core.logger import setup_logger
+from core.result_store import DATA_DIR
+
+logger = setup_logger()
+
+RELATION_PATH = os.path.join(DATA_DIR, "relations.sqlite3")
+
+PAGE_SIZE = 500              # item / trang khi đọc lại (friends, CLI)
+RETENTION = 7 * 24 * 3600    # giây, crawl cũ hơn bị xoá khi mở crawl mới
+
+# cột kind trong bảng relations (= tên stream của crawler)
+KINDS = ("followers", "following")
+
+
+class RelationStore:
+    """
+    Follower / following của 1 lần crawl ghi thẳng xuống SQLite ngay khi về,
+    friend (theo dõi 2 chiều) được ghi lúc chiều thứ 2 xuất hiện
+    → RAM chỉ giữ 1 trang, không cần set(followers) & set(following) cuối task.
+    Đọc lại theo trang bằng cursor (rowid) qua crawl_id.
+    """
+
+    def __init__(self, path=RELATION_PATH):
+        self.path = path
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS crawls (
+                crawl_id   TEXT PRIMARY KEY,
+                source     TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS relations (
+                crawl_id TEXT NOT NULL,
+                kind     TEXT NOT NULL,
+                username TEXT NOT NULL,
+                data     TEXT NOT NULL,
+                PRIMARY KEY (crawl_id, kind, username)
+            );
+            CREATE INDEX IF NOT EXISTS relations_page
+                ON relations (crawl_id, kind);
+            CREATE TABLE IF NOT EXISTS friends (
+                crawl_id TEXT NOT NULL,
+                username TEXT NOT NULL,
+                PRIMARY KEY (crawl_id, username)
+            );
+            CREATE INDEX IF NOT EXISTS friends_page ON friends (crawl_id);
+        """)
+
+    def new_crawl(self, source):
+        self.evict()
+
+        crawl_id = f"{source}-{int(time.time())}-{uuid.uuid4().hex[:6]}"
+        self._db.execute(
+            "INSERT INTO crawls (crawl_id, source, created_at) VALUES (?, ?, ?)",
+            (crawl_id, source, time.time()),
+        )
+        self._db.commit()
+        return crawl_id
+
+    def crawl(self, crawl_id):
+        return SpilledRelations(self, crawl_id)
+
+    def add(self, crawl_id, kind, users, max_new=None):
+        """Ghi user mới (bỏ user đã có), trả về list user vừa ghi"""
+        other = "following" if kind == "followers" else "followers"
+        added = []
+
+        for user in users:
+            if max_new is not None and len(added) >= max_new:
+                break
+
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO relations (crawl_id, kind, username, data) "
+                "VALUES (?, ?, ?, ?)",
+                (crawl_id, kind, user["username"],
+                 json.dumps(user, ensure_ascii=False)),
+            )
+            if not cur.rowcount:
+                continue
+            added.append(user)
+
+            # chiều kia đã có → thành friend ngay
+            self._db.execute(
+                "INSERT OR IGNORE INTO friends (crawl_id, username) "
+                "SELECT ?, ? WHERE EXISTS (SELECT 1 FROM relations "
+                "WHERE crawl_id = ? AND kind = ? AND username = ?)",
+                (crawl_id, user["username"], crawl_id, other, user["username"]),
+            )
+
+        self._db.commit()
+        return added
+
+    def count(self, crawl_id, kind):
+        if kind == "friends":
+            row = self._db.execute(
+                "SELECT COUNT(*) FROM friends WHERE crawl_id = ?", (crawl_id,)
+            ).fetchone()
+        else:
+            row = self._db.execute(
+                "SELECT COUNT(*) FROM relations WHERE crawl_id = ? AND kind = ?",
+                (crawl_id, kind),
+            ).fetchone()
+        return row[0]
+
+    def page(self, crawl_id, kind, after=0, limit=PAGE_SIZE):
+        """
+        1 trang theo thứ tự ghi: (items, cursor trang sau | None).
+        followers / following → dict relation, friends → username.
+        """
+        if kind == "friends":
+            rows = self._db.execute(
+                "SELECT rowid, username FROM friends "
+                "WHERE crawl_id = ? AND rowid > ? ORDER BY rowid LIMIT ?",
+                (crawl_id, after, limit),
+            ).fetchall()
+            items = [username for _, username in rows]
+        else:
+            rows = self._db.execute(
+                "SELECT rowid, data FROM relations "
+                "WHERE crawl_id = ? AND kind = ? AND rowid > ? "
+                "ORDER BY rowid LIMIT ?",
+                (crawl_id, kind, after, limit),
+            ).fetchall()
+            items = [json.loads(data) for _, data in rows]
+
+        cursor = rows[-1][0] if rows and len(rows) == limit else None
+        return items, cursor
+
+    def iter_pages(self, crawl_id, kind, page_size=PAGE_SIZE):
+        after = 0
+        while after is not None:
+            items, after = self.page(crawl_id, kind, after, page_size)
+            if items:
+                yield items
+
+    def drop(self, crawl_id):
+        for table in ("relations", "friends", "crawls"):
+            self._db.execute(
+                f"DELETE FROM {table} WHERE crawl_id = ?", (crawl_id,)
+            )
+        self._db.commit()
+
+    def evict(self, max_age=RETENTION):
+        expired = [
+            row[0] for row in self._db.execute(
+                "SELECT crawl_id FROM crawls WHERE created_at < ?",
+                (time.time() - max_age,),
+            ).fetchall()
+        ]
+        for crawl_id in expired:
+            self.drop(crawl_id)
+        if expired:
+            logger.info(f"🧹 Relation store: dropped {len(expired)} old crawls")
+
+    def close(self):
+        self._db.close()
+
+
+class SpilledRelations:
+    """Handle của 1 crawl_id – thứ crawler giữ thay cho list trong RAM"""
+
+    def __init__(self, store, crawl_id):
+        self.store = store
+        self.crawl_id = crawl_id
+
+    def add(self, kind, users, max_new=None):
+        return self.store.add(self.crawl_id, kind, users, max_new)
+
+    def count(self, kind):
+        return self.store.count(self.crawl_id, kind)
+
+    def page(self, kind, after=0, limit=PAGE_SIZE):
+        return self.store.page(self.crawl_id, kind, after, limit)
+
+    def handle(self):
+        # gửi backend thay cho mảng followers / following: dữ liệu đã tới
+        # backend qua chunk (POST /task/{id}/chunk) theo stream cùng tên,
+        # bản SQLite chỉ nằm ở worker (resume / debug, xoá sau RETENTION)
+        return {
+            "crawl_id": self.crawl_id,
+            "delivery": "chunks",
+            "streams": list(KINDS),
+            "counts": {
+                kind: self.count(kind) for kind in (*KINDS, "friends")
+            },
+        }
+
+
+_STORE = None
+
+
+def get_relation_store():
+    global _STORE
+    if _STORE is None:
+        _STORE = RelationStore()
+    return _STORE
+
+
+def close_relation_store():
+    global _STORE
+    if _STORE is not None:
+        _STORE.close()
+        _STORE = None
+
+
+if __name__ == "__main__":
+    # đọc 1 trang từ handle:
+    #   python -m core.relation_store <crawl_id> followers --after 0 --limit 500
+    parser = argparse.ArgumentParser(description="Read a spilled relation crawl")
+    parser.add_argument("crawl_id")
+    parser.add_argument("kind", choices=[*KINDS, "friends"])
+    parser.add_argument("--after", type=int, default=0)
+    parser.add_argument("--limit", type=int, default=PAGE_SIZE)
+    parser.add_argument("--store", default=RELATION_PATH)
+    args = parser.parse_args()
+
+    store = RelationStore(args.store)
+    items, cursor = store.page(args.crawl_id, args.kind, args.after, args.limit)
+    print(json.dumps({"items": items, "next": cursor}, ensure_ascii=False,
+                     indent=2))
+    store.close()
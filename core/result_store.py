@@ -0,0 +1,132 @@
+import json
+import os
+import sqlite3
+import time
+from core.logger import setup_logger
+
+logger = setup_logger()
+
+DATA_DIR = "data"
+STORE_PATH = os.path.join(DATA_DIR, "results.sqlite3")
+
+# loại kết quả → field làm khoá
+KINDS = {
+    "videos": "video_id",
+    "users": "username",
+    "comments": "comment_id",
+}
+
+
+# ===========================
+# INDEXED STORE
+# ===========================
+
+class ResultStore:
+    """
+    Lưu mọi video / user / comment đã crawl (SQLite), khoá theo
+    video_id / username / comment_id → biết item nào đã có từ task trước.
+    `scope` = keyword / video_url mà item được tìm thấy; {kind}_seen giữ mọi
+    cặp (scope, key) vì 1 video có thể xuất hiện ở nhiều keyword.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+
+        for kind in KINDS:
+            self._db.executescript(f"""
+                CREATE TABLE IF NOT EXISTS {kind} (
+                    key        TEXT PRIMARY KEY,
+                    scope      TEXT,
+                    data       TEXT NOT NULL,
+                    first_seen REAL NOT NULL,
+                    last_seen  REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS {kind}_scope ON {kind} (scope);
+                CREATE TABLE IF NOT EXISTS {kind}_seen (
+                    scope TEXT NOT NULL,
+                    key   TEXT NOT NULL,
+                    PRIMARY KEY (scope, key)
+                );
+                INSERT OR IGNORE INTO {kind}_seen (scope, key)
+                    SELECT scope, key FROM {kind} WHERE scope IS NOT NULL;
+            """)
+
+    def known(self, kind, keys, scope=None):
+        """Tập các key đã có trong store (scope → chỉ tính key đã gặp ở scope đó)"""
+        keys = [str(k) for k in keys if k]
+        if not keys:
+            return set()
+
+        if scope is None:
+            sql, params = f"SELECT key FROM {kind} WHERE key IN", []
+        else:
+            sql = f"SELECT key FROM {kind}_seen WHERE scope = ? AND key IN"
+            params = [scope]
+
+        found = set()
+        # SQLite giới hạn số tham số / câu → tra theo lô
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self._db.execute(
+                f"{sql} ({','.join('?' * len(chunk))})",
+                params + chunk,
+            ).fetchall()
+            found.update(row[0] for row in rows)
+        return found
+
+    def save(self, kind, items, scope=None):
+        key_field = KINDS[kind]
+        now = time.time()
+
+        rows = [
+            (
+                str(item[key_field]),
+                scope,
+                json.dumps(item, ensure_ascii=False),
+                now,
+                now,
+            )
+            for item in items if item.get(key_field)
+        ]
+        if not rows:
+            return 0
+
+        # item đã có → cập nhật data + last_seen, giữ first_seen
+        self._db.executemany(
+            f"INSERT INTO {kind} (key, scope, data, first_seen, last_seen) "
+            f"VALUES (?, ?, ?, ?, ?) "
+            f"ON CONFLICT(key) DO UPDATE SET "
+            f"data = excluded.data, last_seen = excluded.last_seen",
+            rows,
+        )
+        if scope is not None:
+            self._db.executemany(
+                f"INSERT OR IGNORE INTO {kind}_seen (scope, key) VALUES (?, ?)",
+                [(scope, row[0]) for row in rows],
+            )
+        self._db.commit()
+        return len(rows)
+
+    def close(self):
+        self._db.close()
+
+
+_STORE = None
+
+
+def get_result_store():
+    global _STORE
+    if _STORE is None:
+        _STORE = ResultStore()
+    return _STORE
+
+
+def close_result_store():
+    global _STORE
+    if _STORE is not None:
+        _STORE.close()
+        _STORE = None
@@ -0,0 +1,124 @@
+import asyncio
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from core import metrics
+
+# ===========================
+# SCROLL ENGINE (đợi tín hiệu thật thay vì sleep cứng)
+# ===========================
+
+# ms giữa 2 lần kiểm tra số node (Playwright chỉ nhận "raf" hoặc số ms;
+# "raf" bị treo ở tab nền khi chạy headful nhiều page / context)
+GROWTH_POLL_MS = 100
+
+_GROWTH_JS = """
+([selector, previous]) =>
+    document.querySelectorAll(selector).length > previous
+"""
+
+
+async def count_items(page, selector):
+    return await page.evaluate(
+        "(sel) => document.querySelectorAll(sel).length", selector
+    )
+
+
+async def wheel(page, dy, times=1, pause=0.1):
+    for _ in range(times):
+        await page.mouse.wheel(0, dy)
+        if pause:
+            await asyncio.sleep(pause)
+
+
+async def scroll_element_to_bottom(page, selector):
+    await page.evaluate(
+        """
+        (sel) => {
+            const el = document.querySelector(sel);
+            if (el) el.scrollTop = el.scrollHeight;
+        }
+        """,
+        selector
+    )
+
+
+async def _wait_growth(page, selector, previous, timeout):
+    try:
+        await page.wait_for_function(
+            _GROWTH_JS,
+            arg=[selector, previous],
+            polling=GROWTH_POLL_MS,
+            timeout=timeout,
+        )
+        return True
+    except PlaywrightTimeoutError:
+        # chỉ hết giờ mới là "không có node mới" – lỗi khác phải nổi lên
+        return False
+
+
+class ScrollEngine:
+    """
+    1 step = scroll + đợi tín hiệu đầu tiên trong các tín hiệu:
+    - collector: có response API mới (ResponseCollector)
+    - selector: số node khớp selector tăng lên (poll mỗi GROWTH_POLL_MS ms)
+    Hết `timeout` ms mà không có gì → tính là 1 round idle.
+    Hết list khi server báo has_more = false hoặc idle `max_idle` round liên tiếp.
+    """
+
+    def __init__(self, page, scroll, selector=None, collector=None,
+                 timeout=5000, max_idle=2):
+        self.page = page
+        self.scroll = scroll
+        self.selector = selector
+        self.collector = collector
+        self.timeout = timeout
+        self.max_idle = max_idle
+
+        self.idle_rounds = 0
+        self.has_more = True
+
+    @property
+    def exhausted(self):
+        return not self.has_more or self.idle_rounds >= self.max_idle
+
+    def update_has_more(self, has_more):
+        # cờ hasMore / has_more từ JSON của server
+        if has_more is not None:
+            self.has_more = bool(has_more)
+
+    async def step(self):
+        with metrics.stage("scroll"):
+            return await self._step()
+
+    async def _step(self):
+        before = None
+        if self.selector:
+            before = await count_items(self.page, self.selector)
+
+        since = self.collector.responses if self.collector else None
+
+        await self.scroll()
+
+        waiters = []
+        if self.collector:
+            waiters.append(asyncio.ensure_future(
+                self.collector.wait_new(since, self.timeout / 1000)
+            ))
+        if self.selector:
+            waiters.append(asyncio.ensure_future(
+                _wait_growth(self.page, self.selector, before, self.timeout)
+            ))
+
+        got = False
+        try:
+            pending = set(waiters)
+            while pending and not got:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                got = any(job.result() for job in done)
+        finally:
+            for job in waiters:
+                job.cancel()
+
+        self.idle_rounds = 0 if got else self.idle_rounds + 1
+        return got
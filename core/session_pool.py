@@ -0,0 +1,367 @@
+import asyncio
+import glob
+import json
+import os
+import time
+from core.browser import browser_responsive, context_memory, new_context
+from core.logger import setup_logger
+from core.metrics import REGISTRY
+from core.page_pool import WarmPagePool
+from core.rate_limiter import get_rate_limiter
+
+logger = setup_logger()
+
+
+# ===========================
+# CONFIG
+# ===========================
+
+SESSION_DIR = "sessions"     # mỗi file *.json = storage_state của 1 tài khoản
+
+QUARANTINE_SECONDS = {       # cách ly session theo tín hiệu xấu
+    "challenge": 30 * 60,
+    "throttled": 5 * 60,
+}
+MAX_STRIKES = 3              # số lần throttled liên tiếp trước khi cách ly
+SAVE_INTERVAL = 5 * 60       # giây, ghi lại cookie mới tối đa 1 lần / khoảng
+
+# recycle context (giữ cookie) khi vượt 1 trong các ngưỡng
+MAX_CONTEXT_TASKS = 200      # task / context
+MAX_CONTEXT_HEAP_MB = 1500   # tổng JS heap các page của context
+
+MAX_BROWSER_AGE = 24 * 3600  # restart cả browser định kỳ (khi không còn task)
+WATCHDOG_INTERVAL = 60       # giây giữa 2 lần ping browser
+CLOSE_TIMEOUT = 10           # browser treo → không đợi close mãi
+
+
+class Session:
+    def __init__(self, name, path, save_path=None):
+        self.name = name
+        self.path = path
+        # file session đơn cũ (git-tracked) chỉ để đọc, state mới ghi
+        # vào thư mục sessions/ (gitignore) → lần sau pool đọc từ đó
+        self.save_path = save_path or path
+        self.context = None
+        self.rate_limiter = get_rate_limiter(name)
+        self.pages = None
+        self.state = None            # storage_state gần nhất (dict)
+
+        self.active = 0
+        self.completed = 0
+        self.strikes = 0
+        self.quarantined_until = 0.0
+        self.tasks_since_recycle = 0
+        self.draining = False        # chờ hết task để recycle context
+        self._last_save = time.monotonic()
+
+    async def open(self, browser, fetch_profile, warm_pages):
+        # context mới lấy cookie từ state vừa lưu (hoặc file session)
+        self.context = await new_context(
+            browser, self.path, fetch_profile, storage_state=self.state
+        )
+        self.pages = await WarmPagePool(
+            self.context, size=warm_pages, rate_limiter=self.rate_limiter,
+        ).start()
+        self.tasks_since_recycle = 0
+        self.draining = False
+
+    async def shutdown(self):
+        if self.pages:
+            await self.pages.close()
+            self.pages = None
+        if self.context:
+            try:
+                await asyncio.wait_for(self.context.close(), CLOSE_TIMEOUT)
+            except Exception:
+                pass
+            self.context = None
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.quarantined_until
+
+    def quarantine(self, outcome):
+        seconds = QUARANTINE_SECONDS.get(outcome, 0)
+        self.quarantined_until = max(
+            self.quarantined_until, time.monotonic() + seconds
+        )
+        self.strikes = 0
+        logger.warning(
+            f"🚧 Session {self.name} quarantined {seconds}s ({outcome})"
+        )
+
+    async def save_state(self, force=False):
+        if not self.context:
+            return
+        if not force and time.monotonic() - self._last_save < SAVE_INTERVAL:
+            return
+
+        self._last_save = time.monotonic()
+        try:
+            state = await asyncio.wait_for(
+                self.context.storage_state(), CLOSE_TIMEOUT
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Session {self.name} storage_state failed: {e}")
+            return
+
+        # giữ trong RAM để recycle / restart browser không mất cookie
+        self.state = state
+        if not self.save_path:
+            return
+
+        # ghi file tạm rồi replace → không làm hỏng session đang có
+        os.makedirs(os.path.dirname(self.save_path) or ".", exist_ok=True)
+        tmp = f"{self.save_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.save_path)
+
+
+class SessionPool:
+    """
+    Mỗi storage_state → 1 context riêng (cookie, limiter, sức khoẻ riêng).
+    Task được giao cho session khoẻ đang chạy ít task nhất.
+
+    Bộ nhớ: context được recycle giữa 2 task (lưu cookie → đóng → mở lại)
+    khi chạy quá max_context_tasks task hoặc JS heap vượt max_context_heap_mb;
+    watch() ping browser và restart (qua relaunch) khi treo hoặc quá tuổi.
+    """
+
+    def __init__(self, browser, directory=SESSION_DIR, fallback_file=None,
+                 fetch_profile="full", max_tasks_per_session=2, warm_pages=1,
+                 relaunch=None, max_context_tasks=MAX_CONTEXT_TASKS,
+                 max_context_heap_mb=MAX_CONTEXT_HEAP_MB,
+                 max_browser_age=MAX_BROWSER_AGE):
+        self.browser = browser
+        self.directory = directory
+        self.fallback_file = fallback_file
+        self.fetch_profile = fetch_profile
+        self.max_tasks_per_session = max_tasks_per_session
+        self.warm_pages = warm_pages
+        self.relaunch = relaunch        # coroutine fn → browser mới
+        self.max_context_tasks = max_context_tasks
+        self.max_context_heap_mb = max_context_heap_mb
+        self.max_browser_age = max_browser_age
+
+        self.sessions = []
+        self._changed = asyncio.Condition()
+        self._lifecycle = asyncio.Lock()
+        self._restart_pending = False
+        self._browser_started = time.monotonic()
+
+    def _session_files(self):
+        files = sorted(glob.glob(os.path.join(self.directory, "*.json")))
+        if files:
+            return files
+
+        # chưa có thư mục sessions → dùng file session đơn cũ
+        return [self.fallback_file] if self.fallback_file else [None]
+
+    async def start(self):
+        for path in self._session_files():
+            name = (
+                os.path.splitext(os.path.basename(path))[0] if path
+                else "default"
+            )
+            save_path = (
+                os.path.join(self.directory, f"{name}.json")
+                if path and path == self.fallback_file else path
+            )
+            session = Session(name, path, save_path)
+            session.rate_limiter.listeners.append(
+                self._health_listener(session)
+            )
+            await session.open(self.browser, self.fetch_profile, self.warm_pages)
+            self.sessions.append(session)
+
+        logger.info(f"👥 Session pool: {[s.name for s in self.sessions]}")
+        return self
+
+    def _health_listener(self, session):
+        def _listener(outcome):
+            if outcome == "challenge":
+                session.quarantine(outcome)
+            elif outcome == "throttled":
+                session.strikes += 1
+                if session.strikes >= MAX_STRIKES:
+                    session.quarantine(outcome)
+        return _listener
+
+    def _pick(self):
+        if self._restart_pending:
+            return None
+
+        candidates = [
+            s for s in self.sessions
+            if s.healthy and not s.draining and s.context
+            and s.active < self.max_tasks_per_session
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda s: (s.active, s.completed))
+
+    async def acquire(self):
+        async with self._changed:
+            while True:
+                session = self._pick()
+                if session:
+                    session.active += 1
+                    return session
+
+                # hết session rảnh / khoẻ → đợi release hoặc hết cách ly
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=5)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, session, ok=True):
+        session.active -= 1
+        session.completed += 1
+        session.tasks_since_recycle += 1
+        if ok and session.healthy:
+            session.strikes = 0
+
+        if not session.draining and await self._needs_recycle(session):
+            session.draining = True
+
+        # không nhận task mới cho session đang drain, task cuối xong → recycle
+        if session.draining and session.active == 0:
+            await self._recycle(session)
+        else:
+            await session.save_state()
+
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _needs_recycle(self, session):
+        if not session.context:
+            return False
+
+        usage = await context_memory(session.context)
+        REGISTRY.set_gauge("js_heap_mb", session.name, usage["js_heap_mb"])
+        REGISTRY.set_gauge("dom_nodes", session.name, usage["nodes"])
+        REGISTRY.set_gauge("pages", session.name, usage["pages"])
+
+        reason = None
+        if session.tasks_since_recycle >= self.max_context_tasks:
+            reason = f"{session.tasks_since_recycle} tasks"
+        elif usage["js_heap_mb"] >= self.max_context_heap_mb:
+            reason = f"JS heap {usage['js_heap_mb']} MB"
+
+        if reason:
+            logger.info(f"♻️ Session {session.name} draining ({reason})")
+        return bool(reason)
+
+    async def _recycle(self, session):
+        async with self._lifecycle:
+            # restart browser vừa chạy xong → context đã mới
+            if not session.draining or session.active:
+                return
+
+            await session.save_state(force=True)
+            await session.shutdown()
+            if await self._reopen(session):
+                REGISTRY.incr(None, "context_recycles")
+                logger.info(f"♻️ Session {session.name} context recycled")
+
+    async def _reopen(self, session):
+        # gọi khi đang giữ _lifecycle; lỗi → context = None, watch() thử lại
+        try:
+            await session.open(self.browser, self.fetch_profile, self.warm_pages)
+            return True
+        except Exception as e:
+            logger.error(f"❌ Session {session.name} reopen failed: {e}")
+            await session.shutdown()
+            return False
+
+    async def _reopen_stuck(self):
+        # chỉ mở lại session mất context, session khác vẫn chạy task bình thường
+        async with self._lifecycle:
+            for session in self.sessions:
+                if session.context is None and await self._reopen(session):
+                    logger.info(f"♻️ Session {session.name} context reopened")
+
+        async with self._changed:
+            self._changed.notify_all()
+
+    # ===========================
+    # BROWSER WATCHDOG
+    # ===========================
+
+    async def watch(self, interval=WATCHDOG_INTERVAL):
+        """Chạy nền: ping browser, restart khi treo / quá tuổi"""
+        while True:
+            await asyncio.sleep(interval)
+
+            # chỉ browser treo mới restart ngay (task đang chạy cũng đã chết)
+            if not await browser_responsive(self.browser):
+                logger.error("💀 Browser not responding → restart")
+                await self.restart_browser()
+                continue
+
+            if any(s.context is None for s in self.sessions):
+                await self._reopen_stuck()
+
+            if time.monotonic() - self._browser_started >= self.max_browser_age:
+                # ngừng giao task, đợi task đang chạy xong rồi restart
+                self._restart_pending = True
+
+            if self._restart_pending and all(
+                s.active == 0 for s in self.sessions
+            ):
+                await self.restart_browser()
+
+    async def restart_browser(self):
+        if not self.relaunch:
+            logger.error("❌ Browser restart needed but no relaunch configured")
+            return
+
+        async with self._lifecycle:
+            self._restart_pending = True
+
+            for session in self.sessions:
+                await session.save_state(force=True)
+                await session.shutdown()
+
+            try:
+                await asyncio.wait_for(self.browser.close(), CLOSE_TIMEOUT)
+            except Exception:
+                pass
+
+            try:
+                self.browser = await self.relaunch()
+                for session in self.sessions:
+                    await session.open(
+                        self.browser, self.fetch_profile, self.warm_pages
+                    )
+            except Exception as e:
+                # session chưa mở lại → lần watch() sau thử tiếp
+                logger.error(f"❌ Browser restart failed: {e}")
+            else:
+                self._browser_started = time.monotonic()
+                REGISTRY.incr(None, "browser_restarts")
+                logger.info("🔄 Browser restarted")
+            finally:
+                self._restart_pending = False
+
+        async with self._changed:
+            self._changed.notify_all()
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            s.name: {
+                "active": s.active,
+                "completed": s.completed,
+                "tasks_since_recycle": s.tasks_since_recycle,
+                "draining": s.draining,
+                "quarantined_for": max(0, round(s.quarantined_until - now)),
+            }
+            for s in self.sessions
+        }
+
+    async def close(self):
+        for session in self.sessions:
+            await session.save_state(force=True)
+            await session.shutdown()
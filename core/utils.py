@@ -1,9 +1,10 @@
-import asyncio
+import re
+from datetime import datetime, timezone
 
-async def auto_scroll(page, times=10, delay=1.2):
-    for _ in range(times):
-        await page.mouse.wheel(0, 3000)
-        await asyncio.sleep(delay)
+async def emit(sink, stream, items):
+    # đẩy kết quả từng phần ra sink (nếu worker bật streaming)
+    if sink and items:
+        await sink(stream, items)
 
 def safe_get(obj, *keys):
     for k in keys:
@@ -11,3 +12,28 @@ def safe_get(obj, *keys):
             return None
         obj = obj.get(k)
     return obj
+
+def parse_number(text: str | None):
+    # "1.2M" / "15.3K" / "1,234" → int
+    if not text:
+        return None
+
+    text = text.strip().upper()
+
+    try:
+        if text.endswith("M"):
+            return int(float(text[:-1]) * 1_000_000)
+        if text.endswith("K"):
+            return int(float(text[:-1]) * 1_000)
+        return int(re.sub(r"[^\d]", "", text))
+    except Exception:
+        return None
+
+def ts_to_iso(ts):
+    # epoch (giây) của TikTok → ISO UTC
+    if not ts:
+        return None
+    try:
+        return datetime.fromtimestamp(int(ts), tz=timezone.utc).isoformat()
+    except (TypeError, ValueError, OverflowError):
+        return None
@@ -1,29 +1,167 @@
 import asyncio
-import random
+from core.checkpoint import Checkpoint
+from core.dom import take_new_items, untaken
+from core.hydration import extract_profile
+from core.network import ResponseCollector
+from core.page_pool import close_page, open_page, run_on_pages
+from core.profile_cache import get_profile_cache
+from core.rate_limiter import get_rate_limiter
+from core.relation_store import PAGE_SIZE, get_relation_store
+from core.scroll import ScrollEngine, scroll_element_to_bottom, wheel
+from core.utils import emit
+
+# API TikTok tự gọi khi mở / cuộn popup follower, following
+USER_LIST_API = "/api/user/list/"
+
+# stats trong mỗi entry của list API → field số liệu của profile cache
+LIST_STATS = {
+    "followerCount": "follower_count",
+    "followingCount": "following_count",
+    "videoCount": "video_count",
+    "heartCount": "like_count",
+}
+
+# tên stream khi đẩy kết quả từng phần (trùng key trong result)
+STREAMS = {"follower": "followers", "following": "following"}
+
+POPUP = '[data-e2e="follow-info-popup"]'
+POPUP_LIST = f'{POPUP} div[class*="DivUserListContainer"]'
+POPUP_ITEMS = f'{POPUP} li'
+POPUP_ITEM_FIELDS = {"href": {"selector": 'a[href^="/@"]', "attr": "href"}}
 
 
 # ===========================
 # UTILS
 # ===========================
 
-async def _random_delay(delay_range):
-    await asyncio.sleep(random.uniform(*delay_range) / 1000)
+def _relation(source_username, friend_type, username, tiktok_id=None,
+              display_name=None):
+    return {
+        "source_username": source_username,
+        "friend_type": friend_type,
+        "tiktok_id": str(tiktok_id or username),
+        "username": username,
+        "display_name": display_name,
+        "profile_url": f"https://www.tiktok.com/@{username}",
+    }
+
+
+# ===========================
+# COLLECT LIST FROM INTERCEPTED API
+# ===========================
+
+async def _collect_from_api(page, collector, limit, source_username,
+                            friend_type, sink, checkpoint, rate_limiter,
+                            spill=None):
+    key = STREAMS[friend_type]
+    profile_cache = get_profile_cache()
+
+    # ♻️ resume: giữ lại những user đã lấy ở lần chạy trước
+    # (list trong checkpoint, mỗi round chỉ nối thêm user mới)
+    # spill → user nằm trong relation store, RAM chỉ giữ trang đang xử lý
+    users = [] if spill else checkpoint.extend(key, [])
+    seen = {u["username"] for u in users}
+    total = spill.count(key) if spill else len(users)
+    cursor = checkpoint.get(f"{key}_cursor")
+
+    await page.wait_for_selector(POPUP)
+
+    async def scroll():
+        # mỗi lần cuộn tới đáy = 1 request trang kế → đi qua limiter
+        await rate_limiter.acquire("list")
+        await scroll_element_to_bottom(page, POPUP_LIST)
+
+    # cuộn xuống đáy → đợi đúng response trang kế, không sleep cứng
+    engine = ScrollEngine(
+        page,
+        scroll,
+        collector=collector,
+        timeout=10000,
+        max_idle=3,
+    )
+
+    while total < limit and not engine.exhausted:
+        payloads = collector.drain()
+
+        if not payloads:
+            if not await engine.step():
+                print(f"⚠ No list response round: {engine.idle_rounds}")
+            continue
+
+        new_users = []
+
+        for data in payloads:
+            entries = data.get("userList") or []
+            rate_limiter.report(
+                "list", "empty" if not entries and data.get("hasMore") else "ok"
+            )
+
+            page_users = []
+            page_stats = {}
+            for entry in entries:
+                user = entry.get("user") or {}
+                username = user.get("uniqueId")
+                if username and entry.get("stats"):
+                    page_stats[username] = {
+                        field: entry["stats"].get(name)
+                        for name, field in LIST_STATS.items()
+                    }
+                if not username or username in seen:
+                    continue
+
+                page_users.append(_relation(
+                    source_username,
+                    friend_type,
+                    username,
+                    tiktok_id=user.get("id"),
+                    display_name=user.get("nickname"),
+                ))
+
+            # số liệu mới từ list → profile đã cache không phải mở lại trang
+            profile_cache.refresh_stats(page_stats)
+
+            # store bỏ user trùng + ghi friend ngay khi chiều kia đã có
+            if spill:
+                added = spill.add(key, page_users, max_new=limit - total)
+            else:
+                added = page_users[:limit - total]
+                seen.update(u["username"] for u in added)
+
+            total += len(added)
+            new_users.extend(added)
+
+            engine.update_has_more(data.get("hasMore"))
+            cursor = data.get("minCursor", cursor)
+
+        await emit(sink, key, new_users)
+
+        if not spill:
+            checkpoint.extend(key, new_users)
+        checkpoint.set(f"{key}_cursor", cursor)
+
+        print(f"📊 Total collected (api): {total} | cursor={cursor}")
+
+    if not engine.has_more:
+        print("🛑 Server báo hết danh sách (hasMore=false)")
+
+    return total if spill else users[:limit]
 
 
 # ===========================
 # SCROLL LIST
 # ===========================
 
-async def _scroll_until_limit(page, limit, delay_range):
-    users = set()
+async def _scroll_until_limit(page, limit, checkpoint, key, rate_limiter,
+                              dom_window=0):
+    # list theo thứ tự lấy (nằm trong checkpoint) + set để dedup
+    taken = checkpoint.extend(f"{key}_dom", [])
+    users = set(taken)
 
     print("🔎 Waiting for list container...")
 
-    await page.wait_for_selector('[data-e2e="follow-info-popup"]')
+    await page.wait_for_selector(POPUP)
 
-    scroll_container = await page.query_selector(
-        '[data-e2e="follow-info-popup"] div[class*="DivUserListContainer"]'
-    )
+    scroll_container = await page.query_selector(POPUP_LIST)
 
     if not scroll_container:
         print("❌ Không tìm thấy DivUserListContainer")
@@ -39,142 +177,219 @@ async def _scroll_until_limit(page, limit, delay_range):
         box["y"] + box["height"] / 2
     )
 
-    last_count = 0
-    no_change_rounds = 0
+    async def scroll():
+        await rate_limiter.acquire("list")
+        await wheel(page, 300, times=5)
+
+    # wheel trong popup → đợi <li> chưa lấy thay vì sleep 4s
+    # (vẫn đúng khi <li> cũ bị prune khỏi DOM)
+    engine = ScrollEngine(
+        page,
+        scroll,
+        selector=untaken(POPUP_ITEMS),
+        timeout=5000,
+        max_idle=3,
+    )
 
     while len(users) < limit:
-        links = await page.query_selector_all(
-            '[data-e2e="follow-info-popup"] li a[href^="/@"]'
+        # 1 evaluate / round, chỉ đọc <li> mới
+        items = await take_new_items(
+            page, POPUP_ITEMS, POPUP_ITEM_FIELDS, keep=dom_window
         )
 
-        for link in links:
-            href = await link.get_attribute("href")
-            if href:
-                users.add(href.replace("/@", "").strip())
+        new_users = []
+        for item in items:
+            name = (item["href"] or "").replace("/@", "").strip()
+            if name and name not in users:
+                users.add(name)
+                new_users.append(name)
 
         print(f"📊 Total collected: {len(users)}")
+        checkpoint.extend(f"{key}_dom", new_users)
 
-        for _ in range(5):
-            await page.mouse.wheel(0, 300)
-            await asyncio.sleep(0.2)
+        if not await engine.step():
+            print(f"⚠ No change round: {engine.idle_rounds}")
 
-        await asyncio.sleep(4)
-
-        if len(users) == last_count:
-            no_change_rounds += 1
-            print(f"⚠ No change round: {no_change_rounds}")
-        else:
-            no_change_rounds = 0
-
-        if no_change_rounds >= 3:
+        if engine.exhausted:
             print("🛑 Không load thêm → break")
             break
 
-        last_count = len(users)
-
-    return list(users)[:limit]
+    return taken[:limit]
 
 
 # ===========================
-# FOLLOWERS
+# FOLLOWERS / FOLLOWING
 # ===========================
 
-async def crawl_followers(page, username, limit, delay_range):
-    print(f"\n🚀 Crawl followers của {username}")
+async def _crawl_relation_list(page, username, limit, friend_type,
+                               extract_mode="api", sink=None, checkpoint=None,
+                               rate_limiter=None, dom_window=0, spill=None):
+    """
+    Trả về list user; spill → user ghi vào relation store, trả về số user
+    """
+    key = STREAMS[friend_type]
+    checkpoint = checkpoint or Checkpoint()
+    rate_limiter = rate_limiter or get_rate_limiter()
+
+    if checkpoint.get(f"{key}_done"):
+        users = spill.count(key) if spill else checkpoint.get(key, [])
+        print(f"♻️ {key} đã xong từ checkpoint "
+              f"({users if spill else len(users)})")
+        return users
+
+    users = await _open_relation_list(
+        page, username, limit, friend_type, extract_mode, sink, checkpoint,
+        rate_limiter, dom_window, spill
+    )
+    if users is None:
+        return spill.count(key) if spill else []
 
-    await page.goto(f"https://www.tiktok.com/@{username}")
-    await page.wait_for_timeout(5000)
+    if not spill:
+        checkpoint.set(key, users)
+    checkpoint.set(f"{key}_done", True, force=True)
+    return users
 
-    btn = await page.query_selector('strong[data-e2e="followers-count"]')
-    if not btn:
-        return []
 
-    await btn.click()
-    await page.wait_for_selector('[data-e2e="follow-info-popup"]')
+async def _open_relation_list(page, username, limit, friend_type,
+                              extract_mode, sink, checkpoint, rate_limiter,
+                              dom_window, spill=None):
+    count_e2e, tab_title = {
+        "follower": ("followers-count", "Followers"),
+        "following": ("following-count", "Following"),
+    }[friend_type]
+    key = STREAMS[friend_type]
 
-    tab = await page.query_selector(
-        '[data-e2e="follow-info-popup"] strong[title="Followers"]'
-    )
-    if tab:
-        await tab.click()
-        await page.wait_for_timeout(2000)
+    await rate_limiter.acquire("profile")
+    response = await page.goto(f"https://www.tiktok.com/@{username}")
+    await rate_limiter.report_page("profile", page, response)
 
-    return await _scroll_until_limit(page, limit, delay_range)
+    try:
+        await page.wait_for_selector(
+            f'strong[data-e2e="{count_e2e}"]', timeout=15000
+        )
+    except Exception:
+        pass
 
+    btn = await page.query_selector(f'strong[data-e2e="{count_e2e}"]')
+    if not btn:
+        return None
 
-# ===========================
-# FOLLOWING
-# ===========================
+    # 👂 nghe API trước khi mở popup để không lỡ trang đầu
+    collector = None
+    if extract_mode == "api":
+        collector = ResponseCollector(
+            page, USER_LIST_API, rate_limiter=rate_limiter, endpoint="list"
+        ).start()
 
-async def crawl_following(page, username, limit, delay_range):
-    print(f"\n🚀 Crawl following của {username}")
+    try:
+        await btn.click()
+        await page.wait_for_selector(POPUP)
 
-    await page.goto(f"https://www.tiktok.com/@{username}")
-    await page.wait_for_timeout(5000)
+        tab = await page.query_selector(
+            f'{POPUP} strong[title="{tab_title}"]'
+        )
+        if tab:
+            await tab.click()
 
-    btn = await page.query_selector('strong[data-e2e="following-count"]')
-    if not btn:
-        return []
+        if collector:
+            users = await _collect_from_api(
+                page, collector, limit, username, friend_type, sink,
+                checkpoint, rate_limiter, spill
+            )
+            if users or collector.responses > 0:
+                return users
+
+            print("⚠️ Không bắt được API list → fallback DOM")
 
-    await btn.click()
-    await page.wait_for_selector('[data-e2e="follow-info-popup"]')
+        usernames = await _scroll_until_limit(
+            page, limit, checkpoint, key, rate_limiter, dom_window
+        )
+        users = [
+            _relation(username, friend_type, name) for name in usernames
+        ]
+        if spill:
+            # mode DOM vẫn gom trong RAM (giới hạn bởi tốc độ cuộn) → ghi 1 lần
+            users = spill.add(key, users)
+            await emit(sink, key, users)
+            return spill.count(key)
+
+        await emit(sink, key, users)
+        return users
+
+    finally:
+        if collector:
+            collector.stop()
+
+
+async def crawl_followers(page, username, limit, delay_range=None,
+                          extract_mode="api", result_sink=None,
+                          checkpoint=None, rate_limiter=None, dom_window=0,
+                          spill=None):
+    print(f"\n🚀 Crawl followers của {username}")
 
-    tab = await page.query_selector(
-        '[data-e2e="follow-info-popup"] strong[title="Following"]'
+    return await _crawl_relation_list(
+        page, username, limit, "follower",
+        extract_mode=extract_mode,
+        sink=result_sink,
+        checkpoint=checkpoint,
+        rate_limiter=rate_limiter,
+        dom_window=dom_window,
+        spill=spill,
     )
-    if tab:
-        await tab.click()
-        await page.wait_for_timeout(2000)
 
-    return await _scroll_until_limit(page, limit, delay_range)
+
+async def crawl_following(page, username, limit, delay_range=None,
+                          extract_mode="api", result_sink=None,
+                          checkpoint=None, rate_limiter=None, dom_window=0,
+                          spill=None):
+    print(f"\n🚀 Crawl following của {username}")
+
+    return await _crawl_relation_list(
+        page, username, limit, "following",
+        extract_mode=extract_mode,
+        sink=result_sink,
+        checkpoint=checkpoint,
+        rate_limiter=rate_limiter,
+        dom_window=dom_window,
+        spill=spill,
+    )
 
 
 # ===========================
 # PROFILE DETAIL
 # ===========================
 
-async def crawl_profile_detail(page, username, delay_range):
-    profile_url = f"https://www.tiktok.com/@{username}"
-    print(f"👤 Crawl profile: {username}")
+# field profile friend cần (cũng là field phải còn hạn trong cache)
+DETAIL_FIELDS = (
+    "tiktok_id",
+    "username",
+    "display_name",
+    "bio",
+    "avatar_url",
+    "profile_url",
+    "follower_count",
+    "following_count",
+    "video_count",
+)
 
-    await page.goto(profile_url, wait_until="domcontentloaded")
-    await _random_delay(delay_range)
+
+def _detail_from_profile(profile):
+    return {field: profile[field] for field in DETAIL_FIELDS}
+
+
+async def crawl_profile_detail(page, username, delay_range=None,
+                               rate_limiter=None, profile_cache=None):
+    print(f"👤 Crawl profile: {username}")
 
     try:
-        await page.wait_for_selector(
-            "script#__UNIVERSAL_DATA_FOR_REHYDRATION__",
-            state="attached",
-            timeout=10000
+        profile = await extract_profile(
+            page,
+            username,
+            rate_limiter=rate_limiter or get_rate_limiter(),
+            profile_cache=profile_cache or get_profile_cache(),
+            fields=DETAIL_FIELDS,
         )
-
-        data = await page.evaluate("""
-            () => {
-                const el = document.querySelector(
-                    'script#__UNIVERSAL_DATA_FOR_REHYDRATION__'
-                );
-                if (!el) return null;
-                return JSON.parse(el.textContent);
-            }
-        """)
-
-        if not data:
-            return None
-
-        user_info = data["__DEFAULT_SCOPE__"]["webapp.user-detail"]["userInfo"]
-        user = user_info["user"]
-        stats = user_info["stats"]
-
-        return {
-            "tiktok_id": user.get("id"),
-            "username": user.get("uniqueId"),
-            "display_name": user.get("nickname"),
-            "bio": user.get("signature"),
-            "avatar_url": user.get("avatarLarger"),
-            "profile_url": profile_url,
-            "follower_count": stats.get("followerCount"),
-            "following_count": stats.get("followingCount"),
-            "video_count": stats.get("videoCount"),
-        }
+        return _detail_from_profile(profile)
 
     except Exception as e:
         print(f"❌ Profile parse error {username}: {e}")
@@ -188,23 +403,69 @@ async def crawl_profile_detail(page, username, delay_range):
 async def crawl_friends_detail(
     page,
     friends,
-    delay_range,
-    batch_size,
-    batch_delay
+    delay_range=None,
+    batch_size=5,
+    batch_delay=None,
+    result_sink=None,
+    checkpoint=None,
+    rate_limiter=None,
+    profile_cache=None,
+    detail_concurrency=3
 ):
-    results = []
-
-    for i in range(0, len(friends), batch_size):
-        batch = friends[i:i + batch_size]
-        print(f"\n📦 Friends batch {i // batch_size + 1}")
-
-        for username in batch:
-            detail = await crawl_profile_detail(page, username, delay_range)
-            if detail:
-                results.append(detail)
+    checkpoint = checkpoint or Checkpoint()
+    rate_limiter = rate_limiter or get_rate_limiter()
+    profile_cache = profile_cache or get_profile_cache()
+
+    # ♻️ resume: bỏ qua username đã xử lý ở lần chạy trước
+    results = checkpoint.get("friends_detail", [])
+    processed = checkpoint.get("friends_processed", [])
+    done = set(processed)
+    friends = [u for u in friends if u not in done]
+
+    if done:
+        print(f"♻️ Skip {len(done)} friends đã crawl")
+
+    # profile còn trong cache → không cần mở trang
+    cached = []
+    pending = []
+    for username in friends:
+        profile = profile_cache.get(username, fields=DETAIL_FIELDS)
+        if profile:
+            cached.append(_detail_from_profile(profile))
+        else:
+            pending.append(username)
+
+    if cached:
+        print(f"🗃 {len(cached)} friends lấy từ cache")
+        results.extend(cached)
+        processed.extend(d["username"] for d in cached)
+        await emit(result_sink, "friends_detail", cached)
+        checkpoint.set("friends_detail", results)
+        checkpoint.set("friends_processed", processed)
+
+    async def fetch(detail_page, username):
+        return await crawl_profile_detail(
+            detail_page, username,
+            rate_limiter=rate_limiter,
+            profile_cache=profile_cache,
+        )
 
-        if i + batch_size < len(friends):
-            await asyncio.sleep(batch_delay / 1000)
+    async def on_detail(index, detail):
+        if detail:
+            results.append(detail)
+            await emit(result_sink, "friends_detail", [detail])
+
+        processed.append(pending[index])
+        checkpoint.set("friends_detail", results)
+        checkpoint.set("friends_processed", processed)
+
+    await run_on_pages(
+        page,
+        pending,
+        fetch,
+        concurrency=detail_concurrency,
+        on_result=on_detail,
+    )
 
     return results
 
@@ -219,43 +480,114 @@ async def crawl_relations(
     followers_limit,
     following_limit,
     friends_limit,
-    delay_range,
-    batch_size,
-    batch_delay,
+    # delay_range / batch_delay: giữ để tương thích input cũ – nhịp do rate limiter
+    delay_range=None,
+    batch_size=5,
+    batch_delay=None,
     calculate_friends=True,
     crawl_friends_detail_flag=True,
+    extract_mode="api",
+    # số page crawl profile friend song song (chung rate limiter)
+    detail_concurrency=3,
+    # mode DOM: chỉ giữ N <li> đã lấy trong popup (0 = giữ hết)
+    dom_window=0,
+    # list rất lớn: ghi follower / following xuống relation store,
+    # result trả về handle + số lượng thay cho mảng inline
+    spill_to_disk=False,
+    result_sink=None,
+    checkpoint=None,
+    rate_limiter=None,
+    relation_store=None,
     **kwargs  # 👈 BẮT BUỘC
 ):
-    followers = await crawl_followers(
-        page, target_username, followers_limit, delay_range
-    )
-
-    await asyncio.sleep(batch_delay / 1000)
-
-    following = await crawl_following(
-        page, target_username, following_limit, delay_range
-    )
+    rate_limiter = rate_limiter or get_rate_limiter()
+    checkpoint = checkpoint or Checkpoint()
+
+    spill = None
+    if spill_to_disk:
+        # list chỉ nằm trên đĩa worker → chỉ nhận khi worker stream chunk
+        # (STREAM_RESULTS=1, backend có POST /task/{id}/chunk)
+        if not result_sink:
+            raise ValueError(
+                "❌ spill_to_disk cần stream chunk lên backend (STREAM_RESULTS=1)"
+            )
 
-    result = {
-        "username": target_username,
-        "followers_count": len(followers),
-        "following_count": len(following),
-        "followers": followers,
-        "following": following,
-    }
+        relation_store = relation_store or get_relation_store()
+        # ♻️ retry dùng lại crawl_id cũ → user đã ghi không phải crawl lại
+        crawl_id = checkpoint.get("relations_crawl_id")
+        if not crawl_id:
+            crawl_id = relation_store.new_crawl(target_username)
+            checkpoint.set("relations_crawl_id", crawl_id, force=True)
+        spill = relation_store.crawl(crawl_id)
+        print(f"💽 Spill relations → {relation_store.path} ({crawl_id})")
+
+    # followers + following chạy song song trên 2 page, chung limiter
+    following_page = await open_page(page.context)
+    try:
+        followers, following = await asyncio.gather(
+            crawl_followers(
+                page, target_username, followers_limit,
+                extract_mode=extract_mode,
+                result_sink=result_sink,
+                checkpoint=checkpoint,
+                rate_limiter=rate_limiter,
+                dom_window=dom_window,
+                spill=spill,
+            ),
+            crawl_following(
+                following_page, target_username, following_limit,
+                extract_mode=extract_mode,
+                result_sink=result_sink,
+                checkpoint=checkpoint,
+                rate_limiter=rate_limiter,
+                dom_window=dom_window,
+                spill=spill,
+            ),
+        )
+    finally:
+        await close_page(page.context, following_page)
+
+    if spill:
+        # friend đã được ghi dần trong lúc crawl → chỉ đọc trang đầu
+        result = {
+            "username": target_username,
+            "followers_count": followers,
+            "following_count": following,
+            "relations": spill.handle(),
+        }
+    else:
+        result = {
+            "username": target_username,
+            "followers_count": len(followers),
+            "following_count": len(following),
+            "followers": followers,
+            "following": following,
+        }
 
     if calculate_friends:
-        friends = list(set(followers) & set(following))[:friends_limit]
+        if spill:
+            friends, _ = spill.page(
+                "friends",
+                limit=PAGE_SIZE if friends_limit is None else friends_limit,
+            )
+        else:
+            following_names = {u["username"] for u in following}
+            friends = [
+                u["username"] for u in followers
+                if u["username"] in following_names
+            ][:friends_limit]
         result["friends_count"] = len(friends)
         result["friends"] = friends
+        await emit(result_sink, "friends", friends)
 
         if crawl_friends_detail_flag:
             result["friends_detail"] = await crawl_friends_detail(
                 page,
                 friends,
-                delay_range,
-                batch_size,
-                batch_delay
+                result_sink=result_sink,
+                checkpoint=checkpoint,
+                rate_limiter=rate_limiter,
+                detail_concurrency=detail_concurrency,
             )
 
-    return result
\ No newline at end of file
+    return result
@@ -1,33 +1,35 @@
+import asyncio
+import heapq
 import re
-import json
-import csv
-import os
-import random
+from core.dom import snapshot_new_items
+from core.hydration import read_video_item
 from core.logger import setup_logger
+from core.network import ResponseCollector
+from core.page_pool import run_on_pages
+from core.rate_limiter import get_rate_limiter
+from core.result_store import get_result_store
+from core.scroll import ScrollEngine, wheel
+from core.utils import emit, parse_number
 
 logger = setup_logger()
-DATA_DIR = "data"
 
+SORT_KEYS = {
+    "view": "view_count",
+    "like": "like_count",
+    "comment": "comment_count",
+}
 
-# =========================
-# UTILS
-# =========================
-def parse_number(text: str | None):
-    if not text:
-        return None
+# view trên card search bị làm tròn ("1.2M") → nới cận trên thêm 5%
+CARD_VIEW_SLACK = 1.05
 
-    text = text.strip().upper()
-
-    try:
-        if text.endswith("M"):
-            return int(float(text[:-1]) * 1_000_000)
-        if text.endswith("K"):
-            return int(float(text[:-1]) * 1_000)
-        return int(re.sub(r"[^\d]", "", text))
-    except Exception:
-        return None
+# API search TikTok tự gọi khi cuộn (có cờ has_more)
+SEARCH_API = "/api/search/"
+VIDEO_CARD = "a[href*='/video/']"
 
 
+# =========================
+# UTILS
+# =========================
 def extract_video_id(url: str):
     if not url:
         return None
@@ -35,55 +37,27 @@ def extract_video_id(url: str):
     return m.group(1) if m else None
 
 
-def save_to_json(filename, data):
-    os.makedirs(DATA_DIR, exist_ok=True)
-    path = os.path.join(DATA_DIR, filename)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    logger.info(f"💾 Saved JSON: {path}")
-
-
-def save_to_csv(filename, data):
-    if not data:
-        return
-    os.makedirs(DATA_DIR, exist_ok=True)
-    path = os.path.join(DATA_DIR, filename)
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=data[0].keys())
-        writer.writeheader()
-        writer.writerows(data)
-    logger.info(f"📊 Saved CSV: {path}")
-
-
 # =========================
 # SCROLL – TIKTOK SEARCH VIDEO (FINAL)
 # =========================
-async def auto_scroll_video(page):
+async def auto_scroll_video(page, engine):
     """
-    Scroll thật bằng chuột để TikTok trigger lazy load
+    Scroll thật bằng chuột để TikTok trigger lazy load,
+    đợi card / response search mới thay vì sleep cứng
     """
 
     # focus vào feed trước
     feed = page.locator("div[data-e2e='search_video-item-list']")
     if await feed.count() == 0:
         logger.warning("⚠️ Không tìm thấy feed")
-        return
+        return False
 
     await feed.first.hover()
 
-    # đếm trước
-    before = await page.locator("a[href*='/video/']").count()
+    loaded = await engine.step()
 
-    # scroll chuột nhiều lần
-    for _ in range(6):
-        await page.mouse.wheel(0, 1200)
-        await page.wait_for_timeout(800)
-
-    await page.wait_for_timeout(3000)
-
-    after = await page.locator("a[href*='/video/']").count()
-
-    logger.info(f"📈 Video before: {before} | after: {after}")
+    logger.info(f"📈 Scroll loaded more: {loaded}")
+    return loaded
 
 def normalize_tiktok_url(href: str | None):
     """
@@ -106,52 +80,92 @@ def normalize_tiktok_url(href: str | None):
 # =========================
 # SEARCH → VIDEO LIST
 # =========================
-async def extract_top_videos(page, keyword, limit):
+async def extract_top_videos(page, keyword, limit, rate_limiter=None,
+                             known=None):
+    """
+    known(video_ids) → tập id đã crawl ở task trước (incremental):
+    bỏ qua video đó và dừng cuộn khi cả 1 round chỉ toàn video đã biết.
+    """
     url = f"https://www.tiktok.com/search/video?q={keyword}"
     logger.info(f"🌐 Open search video URL: {url}")
 
-    await page.goto(url, timeout=60000, wait_until="domcontentloaded")
-    await page.wait_for_selector("a[href*='/video/']", timeout=15000)
+    rate_limiter = rate_limiter or get_rate_limiter()
+
+    # 👂 nghe API search trước khi goto để lấy cờ has_more
+    collector = ResponseCollector(
+        page, SEARCH_API, rate_limiter=rate_limiter, endpoint="search"
+    ).start()
+    try:
+        return await _extract_top_videos(
+            page, collector, url, limit, rate_limiter, known
+        )
+    finally:
+        collector.stop()
+
+
+async def _extract_top_videos(page, collector, url, limit, rate_limiter,
+                              known):
+    await rate_limiter.acquire("search")
+    response = await page.goto(url, timeout=60000, wait_until="domcontentloaded")
+    await rate_limiter.report_page("search", page, response)
+
+    await page.wait_for_selector(VIDEO_CARD, timeout=15000)
 
     results = []
     seen = set()
 
+    async def scroll():
+        # mỗi lần cuộn = 1 request search trang kế → đi qua limiter
+        await rate_limiter.acquire("search")
+        await wheel(page, 1200, times=6)
+
+    engine = ScrollEngine(
+        page,
+        scroll,
+        selector=VIDEO_CARD,
+        collector=collector,
+        timeout=6000,
+        max_idle=2,
+    )
+
     for round_idx in range(12):
         logger.info(f"🔄 Scroll search round {round_idx + 1}")
 
-        cards = page.locator("a[href*='/video/']")
-        count = await cards.count()
-
-        for i in range(count):
-            card = cards.nth(i)
-            href = await card.get_attribute("href")
-            if not href:
-                continue
+        # 1 evaluate / round – chỉ trả về card chưa thấy
+        cards = await snapshot_new_items(
+            page,
+            VIDEO_CARD,
+            seen_key="search_video",
+            key_pattern=r"/video/(\d+)",
+            fields={
+                "thumbnail": {
+                    "selector": "img[src*='tiktokcdn.com']", "attr": "src"
+                },
+                "view_text": {
+                    "selector": "strong[data-e2e='video-views']",
+                    "attr": "text",
+                },
+            },
+            max_items=limit - len(results),
+        )
+
+        old_ids = known([c["key"] for c in cards]) if known else set()
+        if cards and len(old_ids) == len(cards):
+            logger.info("🛑 Chỉ còn video đã crawl trước đó → dừng (incremental)")
+            break
 
-            video_id = extract_video_id(href)
-            if not video_id or video_id in seen:
+        for card in cards:
+            video_id = card["key"]
+            if video_id in seen or video_id in old_ids:
                 continue
 
             seen.add(video_id)
-            video_url = normalize_tiktok_url(href)
-
-            # ===== thumbnail =====
-            thumb = None
-            img = card.locator("img[src*='tiktokcdn.com']")
-            if await img.count() > 0:
-                thumb = await img.first.get_attribute("src")
-
-            # ===== view count =====
-            view_count = None
-            view_el = card.locator("strong[data-e2e='video-views']")
-            if await view_el.count() > 0:
-                view_count = parse_number(await view_el.first.inner_text())
 
             results.append({
                 "video_id": video_id,
-                "video_url": video_url,
-                "thumbnail": thumb,
-                "view_count": view_count,
+                "video_url": normalize_tiktok_url(card["href"]),
+                "thumbnail": card["thumbnail"],
+                "view_count": parse_number(card["view_text"]),
             })
 
             logger.info(f"🎬 Found video: {video_id}")
@@ -159,7 +173,17 @@ async def extract_top_videos(page, keyword, limit):
             if len(results) >= limit:
                 return results
 
-        await auto_scroll_video(page)
+        for data in collector.drain():
+            engine.update_has_more(data.get("has_more"))
+            empty = not data.get("item_list") and not data.get("data")
+            rate_limiter.report("search", "empty" if empty else "ok")
+
+        # round cuối vẫn có card mới → snapshot thêm 1 lần cho chắc
+        if engine.exhausted and not cards:
+            logger.info("🛑 Hết kết quả search → dừng scroll")
+            break
+
+        await auto_scroll_video(page, engine)
 
     return results
 
@@ -167,10 +191,7 @@ async def extract_top_videos(page, keyword, limit):
 # =========================
 # VIDEO DETAIL
 # =========================
-async def crawl_video_detail(page, keyword, video_url):
-    logger.info(f"🎥 Open video: {video_url}")
-
-    await page.goto(video_url, timeout=60000, wait_until="domcontentloaded")
+async def _video_detail_from_dom(page):
     await page.wait_for_timeout(4000)
 
     # ===== caption =====
@@ -187,11 +208,6 @@ async def crawl_video_detail(page, keyword, video_url):
             return parse_number(text)
         return None
 
-    view_count = await get_stat("view-count")
-    like_count = await get_stat("like-count")
-    comment_count = await get_stat("comment-count")
-    share_count = await get_stat("share-count")
-
     # ===== author =====
     author_username = None
     author = page.locator("a[href^='/@']")
@@ -200,9 +216,6 @@ async def crawl_video_detail(page, keyword, video_url):
         author_username = href.replace("/@", "").split("/")[0]
 
     return {
-        "keyword": keyword,
-
-        "video_url": video_url,
         "caption": caption,
 
         "author_username": author_username,
@@ -211,12 +224,92 @@ async def crawl_video_detail(page, keyword, video_url):
             if author_username else None
         ),
 
-        "view_count": view_count,
-        "like_count": like_count,
-        "comment_count": comment_count,
-        "share_count": share_count,
+        "view_count": await get_stat("view-count"),
+        "like_count": await get_stat("like-count"),
+        "comment_count": await get_stat("comment-count"),
+        "share_count": await get_stat("share-count"),
+
+        "create_time": None,
+    }
+
+
+async def crawl_video_detail(page, keyword, video_url, rate_limiter=None):
+    logger.info(f"🎥 Open video: {video_url}")
+
+    rate_limiter = rate_limiter or get_rate_limiter()
+
+    await rate_limiter.acquire("video")
+    response = await page.goto(
+        video_url, timeout=60000, wait_until="domcontentloaded"
+    )
+    await rate_limiter.report_page("video", page, response)
+
+    # ⚡ đọc itemStruct ngay khi script hydration được attach
+    detail = await read_video_item(page)
+    if not detail:
+        logger.warning(f"⚠️ No hydration data {video_url} → fallback DOM")
+        detail = await _video_detail_from_dom(page)
+        detail["video_id"] = extract_video_id(video_url)
+
+    return {
+        "keyword": keyword,
+        "video_url": video_url,
+        **detail,
     }
 
+# =========================
+# TOP-K
+# =========================
+def _upper_bound(video):
+    # like / comment / view thật ≤ view trên card (đã nới) – không có → chưa biết
+    views = video.get("view_count")
+    return views * CARD_VIEW_SLACK if views is not None else float("inf")
+
+
+async def _deep_scan_top_k(page, videos, k, sort_key, fetch_detail,
+                           concurrency, on_result=None):
+    """
+    Deep scan theo thứ tự cận trên giảm dần trên 1 bộ lane chung queue,
+    giữ min-heap k video tốt nhất. Trước mỗi video: dừng khi video thứ k
+    đã ≥ cận trên của nó (ứng viên sau còn thấp hơn).
+    """
+    candidates = sorted(videos, key=_upper_bound, reverse=True)
+    heap = []   # (giá trị, thứ tự, video) – heap[0] là video yếu nhất top k
+    taken = 0
+
+    def settled(video):
+        nonlocal taken
+        if len(heap) >= k and heap[0][0] >= _upper_bound(video):
+            return True
+        taken += 1
+        return False
+
+    async def collect(index, video):
+        if on_result:
+            await on_result(index, video)
+        if not video:
+            return
+
+        entry = (video.get(sort_key) or 0, -index, video)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    await run_on_pages(
+        page,
+        candidates,
+        fetch_detail,
+        concurrency=concurrency,
+        on_result=collect,
+        until=settled,
+    )
+    if taken < len(candidates):
+        logger.info(f"✂️ Top-{k} chốt sau {taken}/{len(candidates)} video")
+
+    return [video for *_, video in sorted(heap, reverse=True)]
+
+
 # =========================
 # MAIN
 # =========================
@@ -226,59 +319,91 @@ async def crawl_top_posts(
     sort_by="view",
     limit=50,
 
+    # giữ để tương thích input cũ – nhịp request do rate limiter quyết định
     delay_range=(1000, 3000),
     batch_size=5,
     batch_delay=2000,
     deep_scan=False,
+    # số page mở song song khi deep_scan (cùng context, chung rate limiter)
+    detail_concurrency=3,
+    # chỉ lấy video chưa có trong result store (theo dõi keyword định kỳ)
+    incremental=False,
+    # chỉ cần k video tốt nhất theo sort_by → deep scan ứng viên view cao trước
+    top_k=None,
+    result_sink=None,
+    rate_limiter=None,
+    result_store=None,
     **kwargs,
 ):
-    results = []
+    rate_limiter = rate_limiter or get_rate_limiter()
+    result_store = result_store or get_result_store()
 
-    videos = await extract_top_videos(page, keyword, limit)
-    logger.info(f"📋 Tổng video lấy được: {len(videos)}")
+    known = None
+    if incremental:
+        def known(ids):
+            return result_store.known("videos", ids, scope=keyword)
 
-    for idx, video in enumerate(videos, 1):
-        try:
-            if deep_scan:
-                detail = await crawl_video_detail(
-                    page,  keyword, video["video_url"]
-                )
-                video.update(detail)
-            else:
-                video.update({
-                    "keyword": keyword,
-                })
+    videos = await extract_top_videos(
+        page, keyword, limit, rate_limiter, known
+    )
+    logger.info(f"📋 Tổng video lấy được: {len(videos)}")
 
-            results.append(video)
+    sort_key = SORT_KEYS.get(sort_by)
 
-        except Exception as e:
-            logger.warning(f"❌ Skip video | {e}")
+    async def fetch_detail(detail_page, video):
+        detail = await crawl_video_detail(
+            detail_page, keyword, video["video_url"], rate_limiter
+        )
+        return {**video, **detail}
 
-        await page.wait_for_timeout(random.randint(*delay_range))
+    # video đã có detail – task timeout / lỗi giữa chừng vẫn stream phần này
+    scanned = []
 
-        if idx % batch_size == 0:
-            logger.info("🧘 Batch pause...")
-            await page.wait_for_timeout(batch_delay)
+    async def on_detail(_, video):
+        if video:
+            scanned.append(video)
 
-        if len(results) >= limit:
-            break
+    try:
+        if deep_scan and top_k and sort_key:
+            results = await _deep_scan_top_k(
+                page, videos, top_k, sort_key, fetch_detail,
+                detail_concurrency, on_result=on_detail,
+            )
+        elif deep_scan:
+            # video lỗi → None, bỏ qua; thứ tự giữ theo kết quả search
+            details = await run_on_pages(
+                page,
+                videos,
+                fetch_detail,
+                concurrency=detail_concurrency,
+                on_result=on_detail,
+            )
+            results = [video for video in details if video]
+        else:
+            results = [{**video, "keyword": keyword} for video in videos]
+    except (asyncio.CancelledError, Exception):
+        # wait_for huỷ task (timeout) / deep scan lỗi → stream phần đã crawl
+        # (chưa sort) trước khi thoát; chưa có detail → gửi list search
+        await emit(
+            result_sink, "posts",
+            scanned or [{**video, "keyword": keyword} for video in videos],
+        )
+        raise
+
+    results = results[:limit]
 
     # ===== sort (chỉ có ý nghĩa khi deep_scan) =====
     if deep_scan:
-        sort_key = {
-            "view": "view_count",
-            "like": "like_count",
-            "comment": "comment_count",
-        }.get(sort_by)
-
         if sort_key:
             results.sort(
                 key=lambda x: x.get(sort_key) or 0,
                 reverse=True
             )
 
-    # save_to_json(f"top_posts_{keyword}.json", results)
-    # save_to_csv(f"top_posts_{keyword}.csv", results)
+    # stream SAU khi sort: payload cuối bỏ mảng posts → thứ tự chỉ nằm ở chunk
+    await emit(result_sink, "posts", results)
+
+    result_store.save("videos", results, scope=keyword)
 
     logger.info(f"🏁 Hoàn thành – tổng video: {len(results)}")
     return results
\ No newline at end of file
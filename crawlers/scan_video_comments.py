@@ -1,20 +1,147 @@
-import asyncio
-import random
+from core.checkpoint import Checkpoint
+from core.dom import take_new_items, untaken
+from core.network import ResponseCollector
+from core.rate_limiter import get_rate_limiter
+from core.result_store import get_result_store
+from core.scroll import ScrollEngine, scroll_element_to_bottom
+from core.utils import emit, safe_get, ts_to_iso
+
+# API TikTok tự gọi khi mở / cuộn panel comment
+COMMENT_API = "/api/comment/list/"
+
+COMMENT_PANEL = 'div[class*="DivCommentMain"]'
+COMMENT_BLOCK = 'div[class*="DivCommentObjectWrapper"]'
+
+# field đọc từ mỗi block comment (mode DOM)
+COMMENT_FIELDS = {
+    "href": {"selector": 'a[href^="/@"]', "attr": "href"},
+    "username": {"selector": '[data-e2e^="comment-username"] p', "attr": "text"},
+    "content": {"selector": '[data-e2e="comment-level-1"] span', "attr": "text"},
+    "date": {
+        "selector": 'div[class*="DivCommentSubContentWrapper"] span',
+        "attr": "text",
+    },
+    "likes": {"selector": 'div[class*="DivLikeContainer"] span', "attr": "text"},
+}
+
+
+def _comment_from_api(item, video_url):
+    user = item.get("user") or {}
+    username = user.get("unique_id") or ""
+
+    return {
+        "video_url": video_url,
+
+        "comment_id": str(item.get("cid") or ""),
+        "comment_text": item.get("text") or "",
+
+        "user_id": str(user.get("uid") or ""),
+        "username": username,
+        "display_name": user.get("nickname"),
+        "profile_url": f"https://www.tiktok.com/@{username}",
+
+        "like_count": item.get("digg_count"),
+        "reply_count": item.get("reply_comment_total"),
+        "create_time": ts_to_iso(item.get("create_time")),
+    }
 
 
-async def _random_delay(delay_range):
-    await asyncio.sleep(random.uniform(*delay_range) / 1000)
+# ==========================================================
+# COLLECT COMMENT FROM INTERCEPTED API RESPONSES
+# ==========================================================
+async def _collect_comments_from_api(page, collector, video_url, limit,
+                                     sink, checkpoint, rate_limiter, known):
+    await page.wait_for_selector(COMMENT_PANEL, timeout=20000)
+
+    # ♻️ resume: giữ comment đã lấy ở lần chạy trước
+    # (list trong checkpoint, mỗi round chỉ nối thêm comment mới)
+    results = checkpoint.extend("comments", [])
+    seen = {c["comment_id"] for c in results}
+
+    async def scroll():
+        # mỗi lần kéo tới đáy = 1 request trang comment → đi qua limiter
+        await rate_limiter.acquire("list")
+        await scroll_element_to_bottom(page, COMMENT_PANEL)
+
+    # Kéo tới đáy panel → TikTok tự gọi trang comment tiếp theo
+    engine = ScrollEngine(
+        page,
+        scroll,
+        collector=collector,
+        timeout=8000,
+        max_idle=3,
+    )
+
+    reached_known = False
+
+    while len(results) < limit and not engine.exhausted and not reached_known:
+        payloads = collector.drain()
+
+        if not payloads:
+            if not await engine.step():
+                print(f"⚠ No comment response round: {engine.idle_rounds}")
+            continue
+
+        new_items = []
+
+        for data in payloads:
+            items = data.get("comments") or []
+            rate_limiter.report(
+                "list",
+                "empty" if not items and safe_get(data, "has_more") else "ok"
+            )
+
+            # bỏ reply (chỉ lấy comment cấp 1)
+            comments = [
+                _comment_from_api(item, video_url) for item in items
+                if str(item.get("reply_id") or "0") == "0"
+            ]
+
+            old_ids = set()
+            if known:
+                old_ids = known([c["comment_id"] for c in comments])
+                # cả trang đều đã crawl ở task trước → không cuộn tiếp
+                reached_known = reached_known or (
+                    bool(comments) and len(old_ids) == len(comments)
+                )
+
+            for comment in comments:
+                cid = comment["comment_id"]
+                if (cid and cid not in seen and cid not in old_ids
+                        and len(results) + len(new_items) < limit):
+                    seen.add(cid)
+                    new_items.append(comment)
+
+            engine.update_has_more(safe_get(data, "has_more"))
+
+        await emit(sink, "comments", new_items)
+        checkpoint.extend("comments", new_items)
+
+        print(f"💬 Total comments collected (api): {len(results)}")
+
+    if not engine.has_more:
+        print("🛑 Server báo hết comment (has_more=0)")
+    if reached_known:
+        print("🛑 Chỉ còn comment đã crawl trước đó → dừng (incremental)")
+
+    return results[:limit]
 
 
 # ==========================================================
 # SCROLL COMMENT PANEL + EXTRACT FULL COMMENT DATA
 # ==========================================================
-async def _scroll_comments(page, limit, delay_range):
+def _dom_key(comment):
+    # comment DOM không có id → dedup theo người viết + nội dung + ngày
+    return (comment["profile_url"], comment["comment"], comment["date"])
+
+
+async def _scroll_comments(page, limit, checkpoint, rate_limiter,
+                           dom_window=0):
     print("🔎 Waiting for DivCommentMain...")
 
-    await page.wait_for_selector('div[class*="DivCommentMain"]', timeout=20000)
+    await page.wait_for_selector(COMMENT_PANEL, timeout=20000)
 
-    comment_main = await page.query_selector('div[class*="DivCommentMain"]')
+    comment_main = await page.query_selector(COMMENT_PANEL)
 
     if not comment_main:
         print("❌ Cannot find DivCommentMain")
@@ -31,83 +158,62 @@ async def _scroll_comments(page, limit, delay_range):
 
     print("🖱 Hovered inside DivCommentMain")
 
-    results = []
-    last_count = 0
-    stable_rounds = 0
+    # list nằm trong checkpoint, mỗi round chỉ nối comment mới
+    results = checkpoint.extend("comments_dom", [])
+    # resume: trang mở lại từ đầu → bỏ comment đã có trong checkpoint
+    seen = {_dom_key(c) for c in results}
+
+    async def scroll():
+        await rate_limiter.acquire("list")
+        await page.evaluate("(el) => el.scrollBy(0, 1000)", comment_main)
+
+    # Scroll đúng panel, KHÔNG scroll page → đợi block CHƯA lấy xuất hiện
+    # (đếm block chưa lấy nên vẫn đúng khi block cũ bị prune khỏi DOM)
+    engine = ScrollEngine(
+        page,
+        scroll,
+        selector=untaken(COMMENT_BLOCK),
+        timeout=5000,
+        max_idle=3,
+    )
 
     while len(results) < limit:
 
-        blocks = await page.query_selector_all(
-            'div[class*="DivCommentObjectWrapper"]'
+        # chỉ đọc block mới, block đã lấy bị xoá bớt khi dom_window > 0
+        blocks = await take_new_items(
+            page, COMMENT_BLOCK, COMMENT_FIELDS, keep=dom_window
         )
 
-        print(f"👉 Blocks detected: {len(blocks)}")
+        print(f"👉 New blocks: {len(blocks)}")
 
+        new_items = []
         for block in blocks:
-
-            # ===== PROFILE LINK =====
-            link = await block.query_selector('a[href^="/@"]')
-            href = await link.get_attribute("href") if link else None
-
-            # ===== USERNAME DISPLAY =====
-            username_el = await block.query_selector(
-                '[data-e2e^="comment-username"] p'
-            )
-            username = await username_el.inner_text() if username_el else None
-
-            # ===== COMMENT CONTENT =====
-            content_el = await block.query_selector(
-                '[data-e2e="comment-level-1"] span'
-            )
-            content = await content_el.inner_text() if content_el else None
-
-            # ===== DATE =====
-            date_el = await block.query_selector(
-                'div[class*="DivCommentSubContentWrapper"] span'
-            )
-            date = await date_el.inner_text() if date_el else None
-
-            # ===== LIKE COUNT =====
-            like_el = await block.query_selector(
-                'div[class*="DivLikeContainer"] span'
-            )
-            likes = await like_el.inner_text() if like_el else "0"
-
-            if href:
-                full_url = "https://www.tiktok.com" + href
-
-                comment_data = {
-                    "profile_url": full_url,
-                    "display_name": username,
-                    "comment": content,
-                    "date": date,
-                    "likes": likes
-                }
-
-                if comment_data not in results:
-                    results.append(comment_data)
-
+            href = block["href"]
+            if not href:
+                continue
+
+            comment_data = {
+                "profile_url": "https://www.tiktok.com" + href,
+                "display_name": block["username"],
+                "comment": block["content"],
+                "date": block["date"],
+                "likes": block["likes"] or "0",
+            }
+
+            key = _dom_key(comment_data)
+            if key not in seen:
+                seen.add(key)
+                new_items.append(comment_data)
+
+        checkpoint.extend("comments_dom", new_items)
         print(f"💬 Total comments collected: {len(results)}")
 
-        # Scroll đúng panel, KHÔNG scroll page
-        await page.evaluate(
-            "(el) => el.scrollBy(0, 1000)",
-            comment_main
-        )
-
-        await asyncio.sleep(2)
+        await engine.step()
 
-        if len(results) == last_count:
-            stable_rounds += 1
-        else:
-            stable_rounds = 0
-
-        if stable_rounds >= 4:
+        if engine.exhausted:
             print("🛑 No more comments loading → break")
             break
 
-        last_count = len(results)
-
     return results[:limit]
 
 
@@ -118,16 +224,78 @@ async def crawl_video_comments(
     page,
     video_url,
     limit_comments,
-    delay_range,
-    batch_size,
-    batch_delay,
+    # delay_range / batch_*: giữ để tương thích input cũ – nhịp do rate limiter
+    delay_range=None,
+    batch_size=None,
+    batch_delay=None,
     deep_scan_profile=False,
+    extract_mode="api",
+    # chỉ lấy comment chưa có trong result store (chỉ áp dụng mode api)
+    incremental=False,
+    # mode DOM: chỉ giữ N block comment đã lấy trong page (0 = giữ hết)
+    dom_window=0,
+    result_sink=None,
+    checkpoint=None,
+    rate_limiter=None,
+    result_store=None,
     **kwargs
 ):
     print("\n===== ENTER crawl_video_comments =====")
     print(f"🎬 Video URL: {video_url}")
 
-    await page.goto(video_url)
+    checkpoint = checkpoint or Checkpoint()
+    rate_limiter = rate_limiter or get_rate_limiter()
+    result_store = result_store or get_result_store()
+
+    known = None
+    if incremental:
+        def known(ids):
+            return result_store.known("comments", ids, scope=video_url)
+
+    if checkpoint.get("comments_done"):
+        comments = checkpoint.get("comments", [])
+        print(f"♻️ Comments đã xong từ checkpoint ({len(comments)})")
+        return comments
+
+    # 👂 nghe API comment trước khi goto để không lỡ trang đầu
+    collector = None
+    if extract_mode == "api":
+        collector = ResponseCollector(
+            page, COMMENT_API, rate_limiter=rate_limiter, endpoint="list"
+        ).start()
+
+    try:
+        comments = await _crawl_video_comments(
+            page, collector, video_url, limit_comments, result_sink,
+            checkpoint, rate_limiter, known, dom_window
+        )
+    finally:
+        if collector:
+            collector.stop()
+
+    # comment DOM không có comment_id → không vào store
+    result_store.save("comments", comments, scope=video_url)
+
+    if comments:
+        checkpoint.set("comments", comments)
+        checkpoint.set("comments_done", True, force=True)
+    return comments
+
+
+async def _crawl_video_comments(
+    page,
+    collector,
+    video_url,
+    limit_comments,
+    result_sink,
+    checkpoint,
+    rate_limiter,
+    known,
+    dom_window
+):
+    await rate_limiter.acquire("video")
+    response = await page.goto(video_url)
+    await rate_limiter.report_page("video", page, response)
     await page.wait_for_timeout(5000)
 
     # ==============================
@@ -168,11 +336,32 @@ async def crawl_video_comments(
     # ==============================
     # SCROLL & EXTRACT
     # ==============================
-    comment_data = await _scroll_comments(
-        page,
-        limit_comments,
-        delay_range
-    )
+    comment_data = []
+
+    if collector:
+        comment_data = await _collect_comments_from_api(
+            page,
+            collector,
+            video_url,
+            limit_comments,
+            result_sink,
+            checkpoint,
+            rate_limiter,
+            known
+        )
+
+        if not comment_data and collector.responses == 0:
+            print("⚠️ Không bắt được API comment → fallback DOM")
+
+    if not collector or (not comment_data and collector.responses == 0):
+        comment_data = await _scroll_comments(
+            page,
+            limit_comments,
+            checkpoint,
+            rate_limiter,
+            dom_window
+        )
+        await emit(result_sink, "comments", comment_data)
 
     print(f"✅ Scroll returned {len(comment_data)} comments")
     print("===== EXIT crawl_video_comments =====\n")
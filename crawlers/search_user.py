@@ -1,31 +1,21 @@
-import re
-import json
-import csv
-import os
-from core.utils import auto_scroll
+from core.utils import emit
+from core.hydration import extract_profile
+from core.dom import snapshot_new_items
+from core.profile_cache import get_profile_cache
+from core.rate_limiter import get_rate_limiter
+from core.result_store import get_result_store
+from core.scroll import ScrollEngine, wheel
 from schemas.user import TikTokUser
 from core.logger import setup_logger
-import random
 
 logger = setup_logger()
 
-DATA_DIR = "data"
+USER_CARD = "a[href^='/@']"
 
 
 # =========================
 # UTILS
 # =========================
-def parse_number(text: str):
-    if not text:
-        return None
-    text = text.strip().upper()
-    if text.endswith("M"):
-        return int(float(text[:-1]) * 1_000_000)
-    if text.endswith("K"):
-        return int(float(text[:-1]) * 1_000)
-    return int(re.sub(r"[^\d]", "", text))
-
-
 def detect_language(text: str):
     if not text:
         return "unknown"
@@ -60,63 +50,57 @@ def detect_account_type(username, bio, external_link):
     return "creator"
 
 
-# =========================
-# SAVE FILE
-# =========================
-def save_to_json(filename, data):
-    os.makedirs(DATA_DIR, exist_ok=True)
-    path = os.path.join(DATA_DIR, filename)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    logger.info(f"💾 Saved JSON: {path}")
-
-
-def save_to_csv(filename, data):
-    if not data:
-        return
-    os.makedirs(DATA_DIR, exist_ok=True)
-    path = os.path.join(DATA_DIR, filename)
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=data[0].keys())
-        writer.writeheader()
-        writer.writerows(data)
-    logger.info(f"📊 Saved CSV: {path}")
-
-
 # =========================
 # SEARCH → USERNAME
 # =========================
-async def extract_usernames_from_search(page, keyword, limit):
+async def extract_usernames_from_search(page, keyword, limit,
+                                        rate_limiter=None):
     url = f"https://www.tiktok.com/search/user?q={keyword}"
     logger.info(f"🌐 Open search URL: {url}")
 
-    await page.goto(url, timeout=60000, wait_until="domcontentloaded")
-    await page.wait_for_timeout(4000)
+    rate_limiter = rate_limiter or get_rate_limiter()
+
+    await rate_limiter.acquire("search")
+    response = await page.goto(url, timeout=60000, wait_until="domcontentloaded")
+    await rate_limiter.report_page("search", page, response)
+
+    try:
+        await page.wait_for_selector(USER_CARD, timeout=15000)
+    except Exception:
+        logger.warning("⚠️ Không có user card nào")
+        return []
 
     usernames = []
     seen = set()
 
-    for round_idx in range(6):
-        logger.info(f"🔄 Scroll search round {round_idx + 1}")
-        await auto_scroll(page, 2)
-        await page.wait_for_timeout(2000)
-
-        links = page.locator("a[href^='/@']")
-        count = await links.count()
-        logger.info(f"🔗 Total /@ links found: {count}")
+    async def scroll():
+        await rate_limiter.acquire("search")
+        await wheel(page, 3000, times=2)
 
-        for i in range(count):
-            link = links.nth(i)
+    engine = ScrollEngine(
+        page,
+        scroll,
+        selector=USER_CARD,
+        timeout=5000,
+        max_idle=2,
+    )
 
-            # chỉ giữ user card (có Followers)
-            if await link.locator("p:has-text('Followers')").count() == 0:
-                continue
+    for round_idx in range(6):
+        logger.info(f"🔄 Scroll search round {round_idx + 1}")
 
-            href = await link.get_attribute("href")
-            if not href:
-                continue
+        # chỉ giữ user card (có Followers) – lọc + dedup ngay trong page
+        cards = await snapshot_new_items(
+            page,
+            USER_CARD,
+            seen_key="search_user",
+            key_pattern=r"^/@([^/?]+)",
+            require_text={"selector": "p", "text": "Followers"},
+            max_items=limit - len(usernames),
+        )
+        logger.info(f"🔗 New user cards found: {len(cards)}")
 
-            username = href.replace("/@", "").split("/")[0]
+        for card in cards:
+            username = card["key"]
             if not username or username in seen:
                 continue
 
@@ -127,44 +111,31 @@ async def extract_usernames_from_search(page, keyword, limit):
             if len(usernames) >= limit:
                 return usernames
 
+        await engine.step()
+        if engine.exhausted and not cards:
+            logger.info("🛑 Không load thêm user → dừng scroll")
+            break
+
     return usernames
 
 
 # =========================
 # PROFILE → DATA
 # =========================
-async def crawl_profile(page, keyword, username):
-    url = f"https://www.tiktok.com/@{username}"
-    logger.info(f"👤 Open profile: {url}")
-
-    await page.goto(url, timeout=60000, wait_until="domcontentloaded")
-    await page.wait_for_selector("h1[data-e2e='user-title']", timeout=20000)
-
-    display_name = await page.locator(
-        "h2[data-e2e='user-subtitle']"
-    ).inner_text()
-
-    bio = await page.locator(
-        "h2[data-e2e='user-bio']"
-    ).inner_text()
-
-    followers = parse_number(
-        await page.locator("strong[data-e2e='followers-count']").inner_text()
+async def crawl_profile(page, keyword, username, rate_limiter=None,
+                        profile_cache=None):
+    logger.info(f"👤 Open profile: https://www.tiktok.com/@{username}")
+
+    # profile còn hạn trong cache → không mở lại trang
+    profile = await extract_profile(
+        page,
+        username,
+        rate_limiter=rate_limiter or get_rate_limiter(),
+        profile_cache=profile_cache or get_profile_cache(),
     )
 
-    following = parse_number(
-        await page.locator("strong[data-e2e='following-count']").inner_text()
-    )
-
-    avatar = None
-    avatar_el = page.locator("img[src*='tiktokcdn']")
-    if await avatar_el.count() > 0:
-        avatar = await avatar_el.first.get_attribute("src")
-
-    external_link = None
-    link_el = page.locator("a[data-e2e='user-link']")
-    if await link_el.count() > 0:
-        external_link = await link_el.first.get_attribute("href")
+    bio = profile["bio"]
+    external_link = profile["external_link"]
 
     account_type = detect_account_type(username, bio, external_link)
     country = detect_country(bio, external_link)
@@ -172,19 +143,20 @@ async def crawl_profile(page, keyword, username):
 
     return {
         "keyword": keyword,
-        "tiktok_id": username,
-        "username": username,
-        "display_name": display_name,
+        "tiktok_id": profile["tiktok_id"],
+        "username": profile["username"],
+        "display_name": profile["display_name"],
         "bio": bio,
-        "avatar_url": avatar,
-        "profile_url": url,
+        "avatar_url": profile["avatar_url"],
+        "profile_url": profile["profile_url"],
 
         "account_type": account_type,
         "country": country,
         "primary_language": language,
 
-        "follower_count": followers,
-        "following_count": following,
+        "follower_count": profile["follower_count"],
+        "following_count": profile["following_count"],
+        "video_count": profile["video_count"],
 
         "external_link": external_link,
         "engagement_rate": None  # enrich ở bước sau
@@ -200,21 +172,30 @@ async def crawl_users_by_keyword(
     limit=50,
 
     # ===== config =====
+    # delay_range / batch_*: giữ để tương thích input cũ – nhịp do rate limiter
     delay_range=(2000, 4000),
     batch_size=5,
     batch_delay=6000,
-    deep_scan=True
+    deep_scan=True,
+    result_sink=None,
+    rate_limiter=None,
+    result_store=None,
+    **kwargs,
 ):
     results = []
+    rate_limiter = rate_limiter or get_rate_limiter()
+    result_store = result_store or get_result_store()
 
-    usernames = await extract_usernames_from_search(page, keyword, limit)
+    usernames = await extract_usernames_from_search(
+        page, keyword, limit, rate_limiter
+    )
     logger.info(f"📋 Tổng username lấy được: {len(usernames)}")
 
     for idx, username in enumerate(usernames, 1):
         try:
             if deep_scan:
                 user_data = await crawl_profile(
-                    page, keyword, username
+                    page, keyword, username, rate_limiter
                 )
             else:
                 # scan nhẹ – chỉ lấy username
@@ -229,25 +210,15 @@ async def crawl_users_by_keyword(
                 f"✅ USER @{username} | followers={user_data.get('follower_count')}"
             )
             results.append(user_data)
+            await emit(result_sink, "users", [user_data])
 
         except Exception as e:
             logger.warning(f"❌ Skip @{username} | {e}")
 
-        # ===== human delay =====
-        await page.wait_for_timeout(
-            random.randint(*delay_range)
-        )
-
-        # ===== nghỉ theo batch =====
-        if idx % batch_size == 0:
-            logger.info("🧘 Batch pause...")
-            await page.wait_for_timeout(batch_delay)
-
         if len(results) >= limit:
             break
 
-    # save_to_json(f"users_{keyword}.json", results)
-    # save_to_csv(f"users_{keyword}.csv", results)
+    result_store.save("users", results, scope=keyword)
 
     logger.info(f"🏁 Hoàn thành – tổng user: {len(results)}")
     return results
@@ -1,3 +1,4 @@
+from core import metrics
 from crawlers.scan_top_posts import crawl_top_posts
 from crawlers.search_user import crawl_users_by_keyword
 from crawlers.scan_relations import crawl_relations
@@ -12,9 +13,13 @@ SCAN_DISPATCHER = {
 }
 
 
-async def dispatch_scan(scan_type: str, page, input_data: dict):
+async def dispatch_scan(scan_type: str, page, input_data: dict, **runtime):
+    """
+    runtime: tham số do worker cấp (result_sink, ...), không đến từ task input
+    """
     if scan_type not in SCAN_DISPATCHER:
         raise ValueError(f"❌ Unsupported scan_type: {scan_type}")
 
     crawl_func = SCAN_DISPATCHER[scan_type]
-    return await crawl_func(page=page, **input_data)
\ No newline at end of file
+    with metrics.stage("crawl"):
+        return await crawl_func(page=page, **input_data, **runtime)
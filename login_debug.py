@@ -1,8 +1,11 @@
 import asyncio
 import json
+import os
+import sys
 from playwright.async_api import async_playwright
 
-SESSION_FILE = "tiktok_session.json"
+# python login_debug.py sessions/acc1.json → thêm tài khoản vào session pool
+SESSION_FILE = sys.argv[1] if len(sys.argv) > 1 else "tiktok_session.json"
 
 
 async def login_debug():
@@ -85,6 +88,7 @@ async def login_debug():
 
         print("\n📦 Saving session...")
         storage = await context.storage_state()
+        os.makedirs(os.path.dirname(SESSION_FILE) or ".", exist_ok=True)
         with open(SESSION_FILE, "w", encoding="utf-8") as f:
             json.dump(storage, f, ensure_ascii=False, indent=2)
 
@@ -1,91 +1,313 @@
 import asyncio
+import functools
 import json
-from core.browser import create_browser
+import os
+from core import metrics
+from core.browser import get_resource_blocker, launch_browser, start_chromium
+from core.checkpoint import CheckpointStore
 from core.logger import setup_logger
-from api.tiktok_api import fetch_pending_task, update_task_status
+from core.page_pool import close_page, open_page
+from core.profile_cache import close_profile_cache
+from core.relation_store import close_relation_store, get_relation_store
+from core.result_store import close_result_store
+from core.session_pool import SessionPool
+from api.result_stream import ResultStreamer
+from api.task_queue import TaskPrefetcher
+from api.tiktok_api import close_client, update_task_status
 from dispatch.scan_dispatcher import dispatch_scan
 
 logger = setup_logger()
 SESSION_FILE = "tiktok_session.json"
 
+# thư mục chứa nhiều storage_state (1 file / tài khoản) → pool xoay vòng
+# trống → chạy 1 session từ SESSION_FILE như cũ (chỉ đọc, state làm mới
+# ghi vào SESSION_DIR; SESSION_FILE không commit vào git)
+SESSION_DIR = os.getenv("SESSION_DIR", "sessions")
+
 CRAWL_TIMEOUT = 15 * 60      # 15 phút / task
-POLL_INTERVAL = 50           # 50 giây kiểm tra 1 lần
+POLL_INTERVAL = 15           # backoff tối đa khi backend rỗng (không long-poll)
+LONG_POLL = 25               # giây backend được giữ request chờ task
 
+# tổng số task chạy song song (mỗi task 1 page) + tối đa mỗi session
+MAX_CONCURRENT_TASKS = int(os.getenv("MAX_CONCURRENT_TASKS", "3"))
+MAX_TASKS_PER_SESSION = int(
+    os.getenv("MAX_TASKS_PER_SESSION", str(MAX_CONCURRENT_TASKS))
+)
 
-async def main():
-    logger.info("🚀 TIKTOK CRAWLER WORKER START (LOOP MODE)")
+# page mở sẵn + đã vào TikTok cho mỗi session, task mượn rồi trả
+WARM_PAGES = int(os.getenv("WARM_PAGES", "2"))
+
+# recycle context / restart browser để RAM không tăng dần theo thời gian
+MAX_CONTEXT_TASKS = int(os.getenv("MAX_CONTEXT_TASKS", "200"))
+MAX_CONTEXT_HEAP_MB = int(os.getenv("MAX_CONTEXT_HEAP_MB", "1500"))
+MAX_BROWSER_HOURS = float(os.getenv("MAX_BROWSER_HOURS", "24"))
+
+# "data_only" = chặn video, ảnh, font, tracker | "full" = tải hết
+FETCH_PROFILE = os.getenv("FETCH_PROFILE", "data_only")
+
+# upload kết quả từng phần trong lúc crawl (chunk có seq)
+# cần backend có POST /task/{id}/chunk → mặc định tắt
+# (task spill_to_disk chỉ giao được qua chunk → bị từ chối khi tắt)
+STREAM_RESULTS = os.getenv("STREAM_RESULTS", "0") == "1"
+
+# lưu tiến độ crawl theo task_id → retry chạy tiếp chỗ cũ
+CHECKPOINT_INTERVAL = 10     # giây
+checkpoints = CheckpointStore()
+
+# GET /metrics (Prometheus) – 0 = tắt
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+# chỉ nghe local; Prometheus ở máy khác → đặt METRICS_HOST=0.0.0.0
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+
+async def _report(task_id, status, result=None):
+    # task xong / lỗi → gửi kèm tóm tắt metrics của task
+    task_metrics = None
+    current = metrics.current()
+    if current and status != "running":
+        metrics.REGISTRY.task_done(current.scan_type, status)
+        task_metrics = current.summary()
+        logger.info(f"📈 [{task_id}] {task_metrics}")
+
+    try:
+        await update_task_status(task_id, status, result, task_metrics)
+    except Exception as e:
+        logger.warning(f"⚠️ [{task_id}] update status '{status}' failed: {e}")
+
+
+def _final_payload(result, streamer):
+    # đã stream → chỉ gửi tóm tắt + field vô hướng, không gửi lại mảng lớn
+    if not streamer:
+        return result
+
+    # có chunk upload lỗi (lần này / lần retry trước) → backend thiếu dữ liệu:
+    # gửi lại đủ mảng trong PATCH cuối, kèm tóm tắt stream
+    if streamer.failed:
+        logger.warning(
+            f"⚠️ [{streamer.task_id}] {len(streamer.failed)} chunk failed "
+            f"→ gửi đủ kết quả trong payload cuối"
+        )
+        if isinstance(result, dict):
+            return {**result, "stream": streamer.summary()}
+        return result
+
+    payload = streamer.summary()
+    if isinstance(result, dict):
+        payload.update({
+            k: v for k, v in result.items() if not isinstance(v, list)
+        })
+    return payload
+
+
+def _check_spill_delivery(result, streamer, checkpoint):
+    # relations spill_to_disk: mảng chỉ nằm trên đĩa worker, không gửi bù được
+    # trong PATCH cuối → chunk lỗi = task lỗi
+    relations = result.get("relations") if isinstance(result, dict) else None
+    if not isinstance(relations, dict) or relations.get("delivery") != "chunks":
+        return
+    if not streamer.failed:
+        return
+
+    failed = len(streamer.failed)
+    get_relation_store().drop(relations["crawl_id"])
+    # retry crawl lại từ đầu (crawl_id mới, stream lại đủ), chỉ giữ seq
+    checkpoint.state = {}
+    streamer.failed.clear()
+    raise RuntimeError(
+        f"❌ {failed} chunk upload failed – relations spill chưa tới backend"
+    )
+
+
+async def _error_payload(error, streamer):
+    # flush phần đã crawl để backend vẫn giữ được dữ liệu
+    payload = {"error": error}
+    if streamer:
+        await streamer.close()
+        payload["partial"] = streamer.summary()
+    return payload
+
+
+async def run_task(pool, task):
+    # mọi stage / lệnh Playwright / call backend trong task → metrics của task
+    with metrics.track_task(task["_id"], task["scan_type"]):
+        await _run_task(pool, task)
+
+
+async def _run_task(pool, task):
+    task_id = task["_id"]
+    scan_type = task["scan_type"]
+    input_data = task["input"]
+    timeout = task.get("timeout") or CRAWL_TIMEOUT
+
+    # session khoẻ đang rảnh nhất (đợi nếu tất cả đang bận / bị cách ly)
+    session = await pool.acquire()
+    context = session.context
+    ok = False
+
+    page = None  # 👈 page mượn từ warm pool theo task
+    blocker = get_resource_blocker(context)
+    checkpoint = checkpoints.open(task_id, interval=CHECKPOINT_INTERVAL)
+    streamer = ResultStreamer(task_id, checkpoint) if STREAM_RESULTS else None
+
+    # mọi task trên cùng session dùng chung 1 limiter (nhịp theo tài khoản)
+    runtime = {"checkpoint": checkpoint, "rate_limiter": session.rate_limiter}
+    if streamer:
+        runtime["result_sink"] = streamer
+
+    try:
+        # ✅ MƯỢN PAGE NÓNG CHO TASK
+        page = await open_page(context)
+
+        logger.info(f"🧠 [{task_id}] START CRAWL | session {session.name}")
+        result = await asyncio.wait_for(
+            dispatch_scan(scan_type, page, input_data, **runtime),
+            timeout=timeout
+        )
+        logger.info(f"🎉 [{task_id}] END CRAWL")
+        metrics.incr("items", metrics.count_items(result))
+
+        if streamer:
+            await streamer.close()
+            _check_spill_delivery(result, streamer, checkpoint)
+
+        await _report(task_id, "success", _final_payload(result, streamer))
+        checkpoints.clear(task_id)
+        ok = True
+        logger.info(f"✅ [{task_id}] TASK DONE")
 
-    # 🔹 Browser + context sống lâu
-    playwright, browser, context, _ = await create_browser(
-        headless=False,
-        session_file=SESSION_FILE
+    except asyncio.TimeoutError:
+        logger.error(f"⏰ [{task_id}] TASK TIMEOUT")
+        checkpoint.flush()
+        await _report(task_id, "error", await _error_payload("timeout", streamer))
+
+    except Exception as e:
+        logger.exception(f"❌ [{task_id}] TASK FAILED: {e}")
+        checkpoint.flush()
+        await _report(task_id, "error", await _error_payload(str(e), streamer))
+
+    finally:
+        # ✅ TRẢ PAGE SAU MỖI TASK (task lỗi → pool thay page mới)
+        if page:
+            if blocker:
+                saved = blocker.release_page(page)
+                logger.info(
+                    f"🧱 [{task_id}] blocked {saved['blocked_requests']} req "
+                    f"| ~{saved['bytes_saved'] / 1_000_000:.1f} MB saved"
+                )
+            await close_page(context, page, reusable=ok)
+
+        await pool.release(session, ok=ok)
+
+
+async def main():
+    logger.info(
+        f"🚀 TIKTOK CRAWLER WORKER START (POOL MODE x{MAX_CONCURRENT_TASKS})"
     )
 
+    metrics.instrument_playwright()
+    metrics_server = None
+    if METRICS_PORT:
+        metrics_server = await metrics.start_metrics_server(
+            METRICS_PORT, METRICS_HOST
+        )
+
+    # 🔹 Browser sống lâu, mỗi tài khoản 1 context riêng
+    # context recycle theo ngưỡng, browser restart khi treo / quá tuổi
+    playwright, browser = await launch_browser(headless=False)
+    pool = await SessionPool(
+        browser,
+        directory=SESSION_DIR,
+        fallback_file=SESSION_FILE,
+        fetch_profile=FETCH_PROFILE,
+        max_tasks_per_session=MAX_TASKS_PER_SESSION,
+        warm_pages=WARM_PAGES,
+        relaunch=functools.partial(start_chromium, playwright, headless=False),
+        max_context_tasks=MAX_CONTEXT_TASKS,
+        max_context_heap_mb=MAX_CONTEXT_HEAP_MB,
+        max_browser_age=MAX_BROWSER_HOURS * 3600,
+    ).start()
+    watchdog = asyncio.create_task(pool.watch())
+
+    slots = asyncio.Semaphore(MAX_CONCURRENT_TASKS)
+    running = {}  # task_id -> asyncio.Task
+
+    # lease theo lô + giữ sẵn tối đa MAX_CONCURRENT_TASKS task ở local
+    prefetcher = TaskPrefetcher(
+        prefetch=MAX_CONCURRENT_TASKS,
+        long_poll=LONG_POLL,
+        max_backoff=POLL_INTERVAL,
+    ).start()
+
+    def _on_done(task_id):
+        def _callback(_):
+            running.pop(task_id, None)
+            prefetcher.done(task_id)
+            slots.release()
+        return _callback
+
     try:
         while True:
-            task_id = None
-            page = None  # 👈 page chỉ sống theo task
+            # đợi có slot trống rồi mới lấy task
+            await slots.acquire()
+            spawned = False
 
             try:
-                task = fetch_pending_task()
-
-                if not task:
-                    logger.info("😴 No pending task — sleep 50s")
-                    await asyncio.sleep(POLL_INTERVAL)
-                    continue
+                task = await prefetcher.get()
 
                 task_id = task.get("_id")
                 scan_type = task.get("scan_type")
                 input_data = task.get("input")
 
                 if not task_id or not scan_type or not input_data:
-                    raise ValueError(f"❌ Invalid task format: {task}")
+                    prefetcher.done(task_id)
+                    error = f"❌ Invalid task format: {task}"
+                    # prefetcher đã PATCH "running" → báo lỗi, không để task kẹt
+                    if task_id:
+                        await _report(task_id, "error", {"error": error})
+                    raise ValueError(error)
+
+                # prefetcher đã PATCH "running" lúc lease, phòng backend trả trùng
+                if task_id in running:
+                    continue
 
                 logger.info(f"📥 GOT TASK {task_id} | {scan_type}")
                 logger.info(json.dumps(input_data, indent=2, ensure_ascii=False))
 
-                update_task_status(task_id, "running")
-
-                # ✅ TẠO PAGE MỚI CHO TASK
-                page = await context.new_page()
-
-                logger.info("🧠 START CRAWL")
-                result = await asyncio.wait_for(
-                    dispatch_scan(scan_type, page, input_data),
-                    timeout=CRAWL_TIMEOUT
-                )
-                logger.info("🎉 END CRAWL")
-
-                update_task_status(task_id, "success", result)
-                logger.info("✅ TASK DONE")
-
-            except asyncio.TimeoutError:
-                logger.error("⏰ TASK TIMEOUT")
-                if task_id:
-                    update_task_status(task_id, "error", {"error": "timeout"})
+                worker = asyncio.create_task(run_task(pool, task))
+                running[task_id] = worker
+                worker.add_done_callback(_on_done(task_id))
+                spawned = True
 
             except Exception as e:
-                logger.exception(f"❌ TASK FAILED: {e}")
-                if task_id:
-                    update_task_status(task_id, "error", {"error": str(e)})
+                logger.exception(f"❌ FETCH TASK FAILED: {e}")
 
             finally:
-                # ✅ ĐÓNG PAGE SAU MỖI TASK
-                if page:
-                    try:
-                        await page.close()
-                    except Exception:
-                        pass
-
-                # nghỉ nhịp ngắn trước vòng tiếp theo
-                await asyncio.sleep(2)
+                # slot chỉ giữ khi đã giao cho worker (callback sẽ trả lại)
+                if not spawned:
+                    slots.release()
 
     finally:
-        await context.close()
-        await browser.close()
+        watchdog.cancel()
+        await prefetcher.stop()
+
+        for worker in list(running.values()):
+            worker.cancel()
+        await asyncio.gather(*running.values(), return_exceptions=True)
+
+        await close_client()
+        close_profile_cache()
+        close_result_store()
+        close_relation_store()
+        await pool.close()
+        if metrics_server:
+            metrics_server.close()
+        try:
+            await pool.browser.close()
+        except Exception:
+            pass
         await playwright.stop()
         logger.info("🛑 WORKER STOP")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -10,4 +10,7 @@ class TikTokComment(BaseModel):
     username: str
     display_name: str | None
     profile_url: str
-    
\ No newline at end of file
+
+    like_count: int | None = None
+    reply_count: int | None = None
+    create_time: str | None = None